@@ -1,5 +1,6 @@
 from flask import Flask
 from app.models import db
+from app.schema_upgrade import upgrade_schema
 
 app = Flask(__name__)
 app.config.from_object('config')
@@ -9,5 +10,6 @@ db.init_app(app)
 with app.app_context():
     print(app.config['SQLALCHEMY_DATABASE_URI'])
     db.create_all()
+    upgrade_schema()
 
 from app.routes import upload, parse, validate, export
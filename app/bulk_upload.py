@@ -0,0 +1,299 @@
+from app import app
+from app.models import db, Document
+from app.document_text import (
+    read_paragraphs, save_text_artifact, compute_text_hash, paragraphs_to_text, INVALID_DOCUMENT_ERRORS
+)
+from app.jobs import enqueue_job
+from app.upload_stream import HashingFile, file_id, new_file_hasher
+from concurrent.futures import ThreadPoolExecutor
+import os
+import uuid
+import zipfile
+
+# 单条IN查询最多包含的doc_id数，避免超出数据库的参数个数限制
+QUERY_CHUNK_SIZE = 500
+
+def allowed_extension(filename):
+    return '.' in filename and \
+           filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
+
+def is_archive(filename):
+    return (filename or '').lower().endswith('.zip')
+
+def new_entry(filename, archive=None, upload=None, status=None, message=None):
+    """批量上传中一个文件的处理状态，status为None表示尚待处理"""
+    return {
+        'filename': filename,
+        'archive': archive,
+        'upload': upload,
+        'status': status,
+        'message': message,
+        'doc_id': None
+    }
+
+def archive_members(archive_path):
+    """列出压缩包中可上传的文件，返回 (可上传的成员, 跳过的文件名)
+
+    跳过目录、macOS附带的__MACOSX元数据和不支持的扩展名；解压后总大小超过UPLOAD_ARCHIVE_MAX_BYTES时抛出ValueError。
+    """
+    members, skipped = [], []
+    with zipfile.ZipFile(archive_path) as archive:
+        infos = [info for info in archive.infolist() if not info.is_dir()]
+    max_bytes = app.config.get('UPLOAD_ARCHIVE_MAX_BYTES')
+    if max_bytes and sum(info.file_size for info in infos) > max_bytes:
+        raise ValueError(f"Archive exceeds {max_bytes} bytes when extracted")
+    for info in infos:
+        filename = os.path.basename(info.filename)
+        if info.filename.startswith('__MACOSX/') or filename.startswith('._') or not filename:
+            continue
+        if allowed_extension(filename):
+            members.append(info)
+        else:
+            skipped.append(filename)
+    return members, skipped
+
+def extract_member(archive_path, info, folder):
+    """将压缩包成员解压到临时文件，解压的同时计算摘要
+
+    每个线程单独打开压缩包，各成员的解压互不等待。
+    """
+    buffer_size = app.config.get('UPLOAD_BUFFER_SIZE', 256 * 1024)
+    filename = os.path.basename(info.filename)
+    temp_path = os.path.join(folder, f"temp_{uuid.uuid4().hex}{os.path.splitext(filename)[1].lower()}")
+    upload = HashingFile(temp_path, new_file_hasher(), buffer_size)
+    try:
+        with zipfile.ZipFile(archive_path) as archive, archive.open(info) as member:
+            for chunk in iter(lambda: member.read(buffer_size), b""):
+                upload.write(chunk)
+        upload.close()
+    except Exception:
+        upload.discard()
+        raise
+    return upload
+
+def plan_uploads(uploads):
+    """读取各压缩包的目录（不解压），返回 (待处理的上传项, 需要处理的文件数)
+
+    需要处理的文件数为允许上传的普通文件和压缩包中允许上传的成员数，用于在解压前检查BULK_UPLOAD_MAX_FILES。
+    """
+    planned = []
+    eligible = 0
+    for name, filename, upload in uploads:
+        if not filename:
+            upload.discard()
+            continue
+        upload.close()
+        item = {'filename': filename, 'upload': upload, 'members': None, 'skipped': None, 'error': None}
+        planned.append(item)
+        if not is_archive(filename):
+            eligible += 1 if allowed_extension(filename) else 0
+            continue
+        try:
+            item['members'], item['skipped'] = archive_members(upload.path)
+        except (zipfile.BadZipFile, ValueError) as e:
+            item['error'] = str(e)
+            continue
+        eligible += len(item['members'])
+    return planned, eligible
+
+def discard_planned(planned):
+    for item in planned:
+        item['upload'].discard()
+
+def collect_entries(planned, executor):
+    """将待处理的上传项展开为文件列表，压缩包中的文件并行解压"""
+    folder = app.config['UPLOAD_FOLDER']
+    entries = []
+    for item in planned:
+        filename, upload = item['filename'], item['upload']
+        if not is_archive(filename):
+            if allowed_extension(filename):
+                entries.append(new_entry(filename, upload=upload))
+            else:
+                upload.discard()
+                entries.append(new_entry(filename, status='skipped', message='File type not allowed'))
+            continue
+
+        if item['error']:
+            upload.discard()
+            entries.append(new_entry(filename, status='error', message=item['error']))
+            continue
+
+        entries.extend(new_entry(member, archive=filename, status='skipped', message='File type not allowed')
+                       for member in item['skipped'])
+        futures = [(info, executor.submit(extract_member, upload.path, info, folder)) for info in item['members']]
+        for info, future in futures:
+            member_name = os.path.basename(info.filename)
+            try:
+                entries.append(new_entry(member_name, archive=filename, upload=future.result()))
+            except Exception as e:
+                entries.append(new_entry(member_name, archive=filename, status='error', message=str(e)))
+        upload.discard()
+    return entries
+
+def query_in_chunks(column, values):
+    """按列值批量查询文档，每QUERY_CHUNK_SIZE个值一次IN查询"""
+    values = list(values)
+    documents = []
+    for start in range(0, len(values), QUERY_CHUNK_SIZE):
+        documents.extend(Document.query.filter(column.in_(values[start:start + QUERY_CHUNK_SIZE])).all())
+    return documents
+
+def mark_existing(entry, document, message):
+    entry['upload'].discard()
+    entry['status'] = 'existing'
+    entry['doc_id'] = document.id
+    entry['message'] = message
+
+def mark_duplicate(entry, first):
+    entry['upload'].discard()
+    entry['status'] = 'duplicate'
+    entry['doc_id'] = first['doc_id']
+    entry['message'] = f"与本批次中的 {first['filename']} 内容相同"
+
+def extract_text(upload):
+    """读取临时文件的段落并计算文本哈希"""
+    paragraphs = read_paragraphs(upload.path)
+    return paragraphs, compute_text_hash(paragraphs_to_text(paragraphs))
+
+def deduplicate(entries, executor):
+    """按文件摘要和文本哈希去重：本批次内保留第一个，已有文档各用一次批量查询
+
+    返回待新建的文件列表，每项附带提取的段落和文本哈希；其余文件的状态已更新。
+    """
+    pending = [entry for entry in entries if entry['status'] is None]
+    by_doc_id = {}
+    for entry in pending:
+        entry['doc_id'] = file_id(entry['upload'].hasher)
+        first = by_doc_id.setdefault(entry['doc_id'], entry)
+        if first is not entry:
+            mark_duplicate(entry, first)
+
+    stale = {}
+    for document in query_in_chunks(Document.id, by_doc_id):
+        entry = by_doc_id[document.id]
+        if os.path.exists(document.file_path):
+            mark_existing(entry, document, '文件已存在，返回已有文档')
+            continue
+        # 原始文件已丢失的记录与单文件上传一样替换为新记录
+        stale[document.id] = document
+
+    unique = [entry for entry in by_doc_id.values() if entry['status'] is None]
+    futures = [(entry, executor.submit(extract_text, entry['upload'])) for entry in unique]
+    by_text_hash = {}
+    for entry, future in futures:
+        try:
+            entry['paragraphs'], entry['text_hash'] = future.result()
+        except Exception as e:
+            entry['upload'].discard()
+            entry['status'] = 'error'
+            entry['message'] = f'Invalid document: {str(e)}' if isinstance(e, INVALID_DOCUMENT_ERRORS) else str(e)
+            continue
+        first = by_text_hash.setdefault(entry['text_hash'], entry)
+        if first is not entry:
+            mark_duplicate(entry, first)
+
+    for document in query_in_chunks(Document.text_hash, by_text_hash):
+        entry = by_text_hash[document.text_hash]
+        if entry['status'] is None and document.id not in stale and os.path.exists(document.file_path):
+            mark_existing(entry, document, '文档内容与已有文档相同，返回已有文档')
+
+    return [entry for entry in by_text_hash.values() if entry['status'] is None], stale
+
+def store_documents(entries, stale, file_type):
+    """移动文件、保存文本提取结果，在同一事务中写入全部新文档；失败时回滚并删除已写入的文件"""
+    written = []
+    try:
+        for document in stale.values():
+            db.session.delete(document)
+        for entry in entries:
+            final_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{entry['doc_id']}_{entry['filename']}")
+            os.rename(entry['upload'].path, final_filepath)
+            written.append(final_filepath)
+            _, text_path = save_text_artifact(entry['doc_id'], entry.pop('paragraphs'))
+            written.append(text_path)
+            db.session.add(Document(
+                id=entry['doc_id'],
+                filename=entry['filename'],
+                file_type=file_type,
+                file_path=final_filepath,
+                text_hash=entry['text_hash'],
+                text_path=text_path
+            ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        for entry in entries:
+            entry['upload'].discard()
+            entry['status'] = 'error'
+            entry['message'] = f"保存文档失败: {str(e)}"
+        return
+    for entry in entries:
+        entry['status'] = 'created'
+
+def enqueue_document_jobs(entries, validate, use_llm):
+    """为新建的文档提交后台任务，验证任务依赖同一文档的解析任务，全部任务一次提交"""
+    for entry in entries:
+        entry['jobs'] = {}
+        parse_job = enqueue_job('parse', entry['doc_id'], {'use_llm': use_llm}, commit=False)
+        entry['jobs']['parse'] = parse_job.id
+        if validate:
+            entry['jobs']['validate'] = enqueue_job('validate', entry['doc_id'], depends_on=parse_job.id,
+                                                    commit=False).id
+    db.session.commit()
+
+def entry_to_dict(entry):
+    result = {
+        'filename': entry['filename'],
+        'status': entry['status'],
+        'doc_id': entry['doc_id']
+    }
+    if entry['archive']:
+        result['archive'] = entry['archive']
+    if entry['message']:
+        result['message'] = entry['message']
+    if entry.get('jobs'):
+        result['jobs'] = entry['jobs']
+    return result
+
+def bulk_upload(form, uploads):
+    """批量上传：逐个处理上传的文件和zip压缩包中的文件，返回 (响应数据, 状态码)
+
+    form中file_type对本批次全部文件生效；parse=true时为新建的文档提交解析任务，
+    validate=true时再提交依赖解析任务的验证任务，use_llm传给解析任务。
+    """
+    file_type = form.get('file_type', 'other')
+    flag = lambda name: form.get(name, 'false').lower() == 'true'
+    validate = flag('validate')
+    parse = flag('parse') or validate
+
+    # 解压任何压缩包成员之前按目录中的成员数检查文件数上限
+    planned, eligible = plan_uploads(uploads)
+    if not planned:
+        return {'error': 'No file part'}, 400
+    max_files = app.config.get('BULK_UPLOAD_MAX_FILES')
+    if max_files and eligible > max_files:
+        discard_planned(planned)
+        return {'error': f"Too many files: {eligible} > {max_files}"}, 400
+
+    with ThreadPoolExecutor(max_workers=app.config.get('BULK_UPLOAD_WORKERS', 4)) as executor:
+        entries = collect_entries(planned, executor)
+        new_entries, stale = deduplicate(entries, executor)
+
+    store_documents(new_entries, stale, file_type)
+    created = [entry for entry in new_entries if entry['status'] == 'created']
+    if parse and created:
+        enqueue_document_jobs(created, validate, flag('use_llm'))
+
+    counts = {}
+    for entry in entries:
+        counts[entry['status']] = counts.get(entry['status'], 0) + 1
+    print(f"批量上传 {len(entries)} 个文件: {counts}")
+    return {
+        'total': len(entries),
+        'counts': counts,
+        'results': [entry_to_dict(entry) for entry in entries]
+    }, 200
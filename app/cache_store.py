@@ -0,0 +1,86 @@
+from app.models import db, CacheEntry
+from datetime import datetime
+import os
+import json
+
+def cache_get(namespace, key):
+    """读取缓存项，不存在时返回None"""
+    entry = db.session.get(CacheEntry, (namespace, key))
+    return entry.value if entry else None
+
+CACHE_QUERY_CHUNK = 200  # 批量读写时每条SQL包含的缓存项数，避免超出SQLite的参数个数限制
+
+def cache_get_many(namespace, keys):
+    """批量读取缓存项，返回 {key: value}，只包含命中的项"""
+    keys = list(dict.fromkeys(keys))
+    found = {}
+    for start in range(0, len(keys), CACHE_QUERY_CHUNK):
+        entries = CacheEntry.query.filter(
+            CacheEntry.namespace == namespace,
+            CacheEntry.key.in_(keys[start:start + CACHE_QUERY_CHUNK])
+        ).all()
+        found.update((entry.key, entry.value) for entry in entries)
+    return found
+
+def cache_put(namespace, key, value):
+    """原子地写入或覆盖缓存项"""
+    cache_put_many(namespace, {key: value})
+
+def cache_put_many(namespace, items):
+    """在一个事务中批量写入或覆盖缓存项，items为 {key: value}"""
+    if not items:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {'namespace': namespace, 'key': key, 'value': value, 'updated_time': now}
+        for key, value in items.items()
+    ]
+    dialect = db.engine.dialect.name
+    for start in range(0, len(rows), CACHE_QUERY_CHUNK):
+        chunk = rows[start:start + CACHE_QUERY_CHUNK]
+        if dialect in ('sqlite', 'postgresql'):
+            if dialect == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(CacheEntry).values(chunk)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['namespace', 'key'],
+                set_={'value': stmt.excluded.value, 'updated_time': now}
+            )
+            db.session.execute(stmt)
+        elif dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(CacheEntry).values(chunk)
+            db.session.execute(stmt.on_duplicate_key_update(value=stmt.inserted.value, updated_time=now))
+        else:
+            for row in chunk:
+                db.session.merge(CacheEntry(**row))
+    db.session.commit()
+
+def cache_clear(namespace):
+    """清空指定命名空间的缓存，返回删除的条数"""
+    deleted = CacheEntry.query.filter_by(namespace=namespace).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+def cache_page(namespace, page=1, per_page=50):
+    """分页列出缓存项，按更新时间倒序，返回 (总数, 当前页缓存项)"""
+    query = CacheEntry.query.filter_by(namespace=namespace)
+    total = query.count()
+    entries = query.order_by(CacheEntry.updated_time.desc()) \
+        .offset((page - 1) * per_page).limit(per_page).all()
+    return total, entries
+
+def import_json_cache_index(namespace, index_file):
+    """将旧版JSON缓存索引导入缓存表，导入后重命名原文件"""
+    if not os.path.exists(index_file):
+        return 0
+    with open(index_file, 'r', encoding='utf-8') as f:
+        cache_index = json.load(f)
+    for key, value in cache_index.items():
+        if cache_get(namespace, key) is None:
+            cache_put(namespace, key, value)
+    os.replace(index_file, index_file + '.migrated')
+    print(f"已将 {len(cache_index)} 条缓存索引从 {index_file} 导入 {namespace}")
+    return len(cache_index)
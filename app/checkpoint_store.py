@@ -0,0 +1,27 @@
+from app.models import db, ValidationCheckpoint
+
+def append_checkpoint(doc_id, content_hash, batch_index, results):
+    """将完成的一批验证结论追加到文档的检查点日志并立即提交"""
+    db.session.add(ValidationCheckpoint(
+        doc_id=doc_id,
+        content_hash=content_hash,
+        batch_index=batch_index,
+        results_json=results
+    ))
+    db.session.commit()
+
+def load_checkpoint(doc_id, content_hash):
+    """读取文档在当前需求树内容下已完成批次的结论，返回 ({节点ID: 结论}, 批数)"""
+    rows = ValidationCheckpoint.query.filter_by(doc_id=doc_id, content_hash=content_hash) \
+        .order_by(ValidationCheckpoint.id).all()
+    results_by_id = {}
+    for row in rows:
+        for result in row.results_json:
+            results_by_id[result['id']] = result
+    return results_by_id, len(rows)
+
+def clear_checkpoint(doc_id):
+    """验证结果保存后删除文档的检查点日志，返回删除的条数"""
+    deleted = ValidationCheckpoint.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,204 @@
+from app import app
+from app.models import db
+import os
+import json
+import hashlib
+import zipfile
+from lxml import etree
+
+def compute_text_hash(text):
+    """计算文本内容的MD5哈希值"""
+    hash_md5 = hashlib.md5()
+    hash_md5.update(text.encode('utf-8'))
+    return hash_md5.hexdigest()
+
+W_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_P = W_NAMESPACE + 'p'
+W_R = W_NAMESPACE + 'r'
+W_T = W_NAMESPACE + 't'
+W_TAB = W_NAMESPACE + 'tab'
+W_BR = W_NAMESPACE + 'br'
+W_CR = W_NAMESPACE + 'cr'
+W_TC = W_NAMESPACE + 'tc'
+W_BODY = W_NAMESPACE + 'body'
+W_PPR = W_NAMESPACE + 'pPr'
+W_PSTYLE = W_NAMESPACE + 'pStyle'
+W_OUTLINE_LVL = W_NAMESPACE + 'outlineLvl'
+W_NUMPR = W_NAMESPACE + 'numPr'
+W_VAL = W_NAMESPACE + 'val'
+
+# 文件不是有效的docx（不是zip压缩包、缺少word/document.xml或XML损坏）时read_paragraphs抛出的异常
+INVALID_DOCUMENT_ERRORS = (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError)
+
+def parse_outline_level(element):
+    """将w:outlineLvl转换为标题层级（从1开始），大纲级别9表示正文"""
+    value = int(element.get(W_VAL, 9))
+    return value + 1 if value < 9 else None
+
+def load_docx_styles(archive):
+    """读取styles.xml，返回 {样式ID: {name, outline_level, numbered}}，已沿basedOn继承链展开"""
+    try:
+        root = etree.fromstring(archive.read('word/styles.xml'))
+    except KeyError:
+        return {}
+
+    raw = {}
+    default_id = None
+    for style in root.iter(W_NAMESPACE + 'style'):
+        if style.get(W_NAMESPACE + 'type') != 'paragraph':
+            continue
+        if style.get(W_NAMESPACE + 'default') in ('1', 'true'):
+            default_id = style.get(W_NAMESPACE + 'styleId')
+        name = style.find(W_NAMESPACE + 'name')
+        based_on = style.find(W_NAMESPACE + 'basedOn')
+        pPr = style.find(W_PPR)
+        outline = pPr.find(W_OUTLINE_LVL) if pPr is not None else None
+        raw[style.get(W_NAMESPACE + 'styleId')] = {
+            'name': name.get(W_VAL) if name is not None else '',
+            'based_on': based_on.get(W_VAL) if based_on is not None else None,
+            'outline_level': parse_outline_level(outline) if outline is not None else None,
+            'has_outline': outline is not None,
+            'numbered': pPr is not None and pPr.find(W_NUMPR) is not None
+        }
+
+    styles = {}
+    for style_id, style in raw.items():
+        outline_level = style['outline_level']
+        has_outline = style['has_outline']
+        numbered = style['numbered']
+        seen = {style_id}
+        parent_id = style['based_on']
+        while parent_id in raw and parent_id not in seen:
+            seen.add(parent_id)
+            parent = raw[parent_id]
+            if not has_outline and parent['has_outline']:
+                outline_level = parent['outline_level']
+                has_outline = True
+            numbered = numbered or parent['numbered']
+            parent_id = parent['based_on']
+        styles[style_id] = {'name': style['name'], 'outline_level': outline_level, 'numbered': numbered}
+    # 未指定样式的段落使用默认段落样式
+    if default_id in styles:
+        styles[None] = styles[default_id]
+    return styles
+
+def iter_docx_paragraphs(filepath):
+    """流式读取word/document.xml，逐个产出非空段落（含表格单元格中的段落）
+
+    每个段落为 {text, style_id, style, outline_level, numbered, in_table}。
+    正文的顶层元素处理完后即从内存中移除，内存占用只取决于最大的单个段落或表格。
+    """
+    with zipfile.ZipFile(filepath) as archive:
+        styles = load_docx_styles(archive)
+        with archive.open('word/document.xml') as xml_file:
+            for _, elem in etree.iterparse(xml_file, events=('end',), tag=W_P):
+                parent = elem.getparent()
+                # 文本框等嵌套段落的文字已包含在外层段落中
+                if next(elem.iterancestors(W_P), None) is None:
+                    paragraph = read_paragraph_element(elem, styles)
+                    if paragraph:
+                        yield paragraph
+
+                # 释放已处理完的正文顶层元素（包括之前的表格）
+                if parent is not None and parent.tag == W_BODY:
+                    elem.clear()
+                    while elem.getprevious() is not None:
+                        del parent[0]
+
+def read_paragraph_element(elem, styles):
+    """读取单个w:p元素的文本和段落属性，空段落返回None"""
+    parts = []
+    for node in elem.iter(W_T, W_TAB, W_BR, W_CR):
+        if node.tag == W_T:
+            parts.append(node.text or '')
+        elif node.getparent().tag == W_R:
+            # 段落属性中的w:tabs/w:tab是制表位定义，不是文本
+            parts.append('\t' if node.tag == W_TAB else '\n')
+    text = ''.join(parts).strip()
+    if not text:
+        return None
+
+    style_id = None
+    outline = None
+    numbered = False
+    pPr = elem.find(W_PPR)
+    if pPr is not None:
+        pStyle = pPr.find(W_PSTYLE)
+        style_id = pStyle.get(W_VAL) if pStyle is not None else None
+        outline = pPr.find(W_OUTLINE_LVL)
+        numbered = pPr.find(W_NUMPR) is not None
+
+    style = styles.get(style_id) or {}
+    return {
+        'text': text,
+        'style_id': style_id,
+        'style': style.get('name', ''),
+        'outline_level': parse_outline_level(outline) if outline is not None else style.get('outline_level'),
+        'numbered': numbered or style.get('numbered', False),
+        'in_table': next(elem.iterancestors(W_TC), None) is not None
+    }
+
+def read_docx_paragraphs(filepath):
+    """读取文档段落及其样式、大纲级别和自动编号信息"""
+    return list(iter_docx_paragraphs(filepath))
+
+def extract_text_from_docx(filepath):
+    return paragraphs_to_text(iter_docx_paragraphs(filepath))
+
+def read_txt_paragraphs(filepath):
+    """读取纯文本文档，每个非空行作为一个段落"""
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    try:
+        content = raw.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        content = raw.decode('gb18030', errors='replace')
+
+    paragraphs = []
+    for line in content.splitlines():
+        text = line.strip()
+        if text:
+            paragraphs.append({'text': text, 'style': '', 'outline_level': None, 'numbered': False})
+    return paragraphs
+
+def read_paragraphs(filepath):
+    """按文件类型读取文档段落"""
+    if filepath.lower().endswith('.txt'):
+        return read_txt_paragraphs(filepath)
+    return read_docx_paragraphs(filepath)
+
+def paragraphs_to_text(paragraphs):
+    """将段落拼接为规范化的纯文本"""
+    return '\n'.join(p['text'] for p in paragraphs)
+
+def get_text_artifact_path(doc_id):
+    """获取文档文本提取结果的存储路径"""
+    return os.path.join(app.config['TEXT_FOLDER'], f"{doc_id}.json")
+
+def save_text_artifact(doc_id, paragraphs):
+    """保存文档文本提取结果，返回 (文本哈希, 文件路径)"""
+    text_hash = compute_text_hash(paragraphs_to_text(paragraphs))
+    text_path = get_text_artifact_path(doc_id)
+    os.makedirs(os.path.dirname(text_path), exist_ok=True)
+    with open(text_path, 'w', encoding='utf-8') as f:
+        json.dump({'text_hash': text_hash, 'paragraphs': paragraphs}, f, ensure_ascii=False)
+    return text_hash, text_path
+
+def load_text_artifact(document):
+    """读取上传时提取的文档段落，返回 (段落列表, 文本哈希)
+
+    早期上传的文档没有提取结果时从原始文件补提取一次并记录到文档记录中，
+    原始文件也不存在时返回None。
+    """
+    if document.text_path and os.path.exists(document.text_path):
+        with open(document.text_path, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+        return artifact['paragraphs'], artifact['text_hash']
+
+    if not os.path.exists(document.file_path):
+        return None
+
+    paragraphs = read_paragraphs(document.file_path)
+    document.text_hash, document.text_path = save_text_artifact(document.id, paragraphs)
+    db.session.commit()
+    return paragraphs, document.text_hash
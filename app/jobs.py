@@ -0,0 +1,202 @@
+from app import app
+from app.models import db, Job
+from datetime import datetime, timedelta
+from sqlalchemy import or_
+from sqlalchemy.orm import aliased
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+JOB_KINDS = ('parse', 'validate')
+
+def enqueue_job(kind, doc_id, params=None, depends_on=None, commit=True):
+    """创建排队中的任务
+
+    depends_on为前置任务ID，前置任务成功后才会被领取；commit=False时由调用方统一提交。
+    """
+    job = Job(
+        id=uuid.uuid4().hex,
+        kind=kind,
+        doc_id=doc_id,
+        params_json=params or {},
+        status='queued',
+        progress=0.0,
+        message='排队中',
+        depends_on=depends_on
+    )
+    db.session.add(job)
+    if commit:
+        db.session.commit()
+    return job
+
+def job_to_dict(job):
+    """任务状态的响应数据（不含结果）"""
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'doc_id': job.doc_id,
+        'params': job.params_json,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'attempts': job.attempts,
+        'worker_id': job.worker_id,
+        'depends_on': job.depends_on,
+        'created_time': job.created_time.isoformat() if job.created_time else None,
+        'started_time': job.started_time.isoformat() if job.started_time else None,
+        'finished_time': job.finished_time.isoformat() if job.finished_time else None
+    }
+
+def claim_next_job(worker_id):
+    """领取最早排队且前置任务已成功的任务
+
+    通过带状态条件的UPDATE抢占任务，多个进程或多台主机共享同一数据库时
+    只有一个工作进程能领取成功。没有可领取的任务时返回None。
+    """
+    dependency = aliased(Job)
+    while True:
+        candidate = Job.query.outerjoin(dependency, Job.depends_on == dependency.id).filter(
+            Job.status == 'queued',
+            or_(Job.depends_on.is_(None), dependency.status == 'succeeded')
+        ).order_by(Job.created_time).first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+
+        now = datetime.utcnow()
+        claimed = Job.query.filter_by(id=candidate.id, status='queued').update({
+            'status': 'running',
+            'worker_id': worker_id,
+            'attempts': Job.attempts + 1,
+            'started_time': now,
+            'heartbeat_time': now,
+            'message': '执行中'
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return db.session.get(Job, candidate.id)
+
+def requeue_stale_jobs():
+    """将心跳超时的运行中任务重新排队，超过最大执行次数的标记为失败"""
+    deadline = datetime.utcnow() - timedelta(seconds=app.config.get('JOB_STALE_TIMEOUT', 120))
+    max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+
+    stale = Job.query.filter(Job.status == 'running', Job.heartbeat_time < deadline)
+    stale.filter(Job.attempts < max_attempts).update({
+        'status': 'queued',
+        'worker_id': None,
+        'message': '工作进程无响应，任务重新排队'
+    }, synchronize_session=False)
+    stale.filter(Job.attempts >= max_attempts).update({
+        'status': 'failed',
+        'finished_time': datetime.utcnow(),
+        'error': '工作进程多次无响应，任务已放弃'
+    }, synchronize_session=False)
+    db.session.commit()
+
+def fail_blocked_jobs():
+    """前置任务失败时，依赖它的排队任务无法再执行，标记为失败"""
+    dependency = aliased(Job)
+    blocked = [job_id for job_id, in db.session.query(Job.id).join(dependency, Job.depends_on == dependency.id).filter(
+        Job.status == 'queued', dependency.status == 'failed'
+    )]
+    if blocked:
+        Job.query.filter(Job.id.in_(blocked), Job.status == 'queued').update({
+            'status': 'failed',
+            'finished_time': datetime.utcnow(),
+            'message': '执行失败',
+            'error': '前置任务失败'
+        }, synchronize_session=False)
+    db.session.commit()
+
+def update_job_progress(job_id, progress, message=None):
+    """更新任务进度，同时刷新心跳"""
+    values = {'progress': progress, 'heartbeat_time': datetime.utcnow()}
+    if message:
+        values['message'] = message
+    Job.query.filter_by(id=job_id).update(values, synchronize_session=False)
+    db.session.commit()
+
+def heartbeat_loop(job_id, stop_event):
+    """在独立线程中定期刷新任务心跳，避免长时间的大模型调用被误判为进程退出"""
+    interval = app.config.get('JOB_HEARTBEAT_INTERVAL', 10)
+    with app.app_context():
+        while not stop_event.wait(interval):
+            Job.query.filter_by(id=job_id).update(
+                {'heartbeat_time': datetime.utcnow()}, synchronize_session=False
+            )
+            db.session.commit()
+
+def run_parse_job(job):
+    from app.routes.parse import run_parse
+    params = job.params_json or {}
+    return run_parse(job.doc_id, params.get('use_llm', False))
+
+def run_validate_job(job):
+    from app.routes.validate import run_validation
+
+    def progress(done, total):
+        update_job_progress(job.id, done / total, f"已完成 {done}/{total} 批")
+
+    return run_validation(job.doc_id, progress)
+
+JOB_HANDLERS = {
+    'parse': run_parse_job,
+    'validate': run_validate_job
+}
+
+def run_job(job):
+    """执行任务并记录结果"""
+    stop_event = threading.Event()
+    heartbeat = threading.Thread(target=heartbeat_loop, args=(job.id, stop_event), daemon=True)
+    heartbeat.start()
+    try:
+        body, status = JOB_HANDLERS[job.kind](job)
+    except Exception as e:
+        traceback.print_exc()
+        db.session.rollback()
+        body, status = {'error': str(e)}, 500
+    finally:
+        stop_event.set()
+        heartbeat.join()
+
+    job = db.session.get(Job, job.id)
+    if job is None:
+        # 执行期间文档被删除，任务记录随之删除
+        db.session.rollback()
+        return
+    job.finished_time = datetime.utcnow()
+    if status == 200:
+        job.status = 'succeeded'
+        job.progress = 1.0
+        job.message = '已完成'
+        job.result_json = body
+    else:
+        job.status = 'failed'
+        job.message = '执行失败'
+        job.error = body.get('error', str(body))
+    db.session.commit()
+
+def work(worker_id=None, once=False):
+    """工作进程主循环：回收超时任务、领取并执行任务，空闲时按间隔轮询"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    poll_interval = app.config.get('JOB_POLL_INTERVAL', 2)
+    print(f"工作进程 {worker_id} 已启动")
+
+    with app.app_context():
+        while True:
+            requeue_stale_jobs()
+            fail_blocked_jobs()
+            job = claim_next_job(worker_id)
+            if job:
+                print(f"[{worker_id}] 开始执行任务 {job.id} ({job.kind} {job.doc_id})")
+                run_job(job)
+                print(f"[{worker_id}] 任务 {job.id} 结束")
+            elif once:
+                return
+            else:
+                time.sleep(poll_interval)
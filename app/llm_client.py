@@ -0,0 +1,287 @@
+from app import app
+from app.models import db, LLMCall
+from requests.adapters import HTTPAdapter
+import json
+import os
+import random
+import threading
+import time
+import requests
+
+# 限流和服务端临时错误可以重试，其余4xx错误（如密钥无效、请求过长）重试也不会成功
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+class LLMError(Exception):
+    """大模型调用失败"""
+
+class LLMTimeoutError(LLMError):
+    """连接或读取超时"""
+
+class LLMConnectionError(LLMError):
+    """无法连接到大模型服务"""
+
+class LLMHTTPError(LLMError):
+    """大模型服务返回错误状态码"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+class LLMRateLimitError(LLMHTTPError):
+    """请求被限流（429）"""
+
+class LLMResponseError(LLMError):
+    """响应内容无法解析"""
+
+def estimate_tokens(text):
+    """粗略估算文本的token数：中文等非ASCII字符按每字1个，ASCII字符按每4个1个，宁多勿少"""
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 127)
+    return non_ascii + (len(text) - non_ascii + 3) // 4
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """进程内共享的HTTP会话，复用连接池和keep-alive连接
+
+    fork出的工作进程不能复用父进程的连接，按进程号重新创建。
+    """
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        with _session_lock:
+            if _session is None or _session_pid != os.getpid():
+                session = requests.Session()
+                session.trust_env = False
+                pool_size = app.config.get('API_POOL_SIZE', 16)
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session, _session_pid = session, os.getpid()
+    return _session
+
+def build_chat_request(prompt, system_prompt, max_tokens, temperature=0.3, model=None, api_key=None):
+    """构造对话补全接口的请求头和请求体"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Authorization': f"Bearer {api_key or app.config.get('API_KEY_DEFAULT')}"
+    }
+
+    data = {
+        'model': model or app.config.get('API_MODEL_DEFAULT', 'deepseek-chat'),
+        'messages': [
+            {
+                'role': 'system',
+                'content': system_prompt
+            },
+            {
+                'role': 'user',
+                'content': prompt
+            }
+        ],
+        'temperature': temperature,
+        'max_tokens': max_tokens
+    }
+    return headers, data
+
+def get_backoff_delay(attempt, retry_after=None):
+    """第attempt次重试前的等待时间：指数退避加全抖动，服务端给出Retry-After时以其为下限"""
+    base = app.config.get('API_BACKOFF_BASE', 1)
+    cap = app.config.get('API_BACKOFF_MAX', 30)
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+def parse_retry_after(response):
+    """读取Retry-After响应头（秒），没有或无法解析时返回None"""
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+def post_chat(data, headers, api_url=None, timeout=None, stream=False):
+    """发送一次请求，将requests的异常转换为LLMError子类"""
+    api_url = api_url or app.config.get('API_URL_DEFAULT', 'https://api.deepseek.com')
+    timeout = (app.config.get('API_CONNECT_TIMEOUT', 10), timeout or app.config.get('API_TIMEOUT', 60))
+    try:
+        response = get_session().post(
+            api_url + '/chat/completions',
+            headers=headers,
+            json=data,
+            timeout=timeout,
+            stream=stream
+        )
+    except requests.Timeout as e:
+        raise LLMTimeoutError(f"请求超时: {e}") from e
+    except requests.RequestException as e:
+        raise LLMConnectionError(f"连接失败: {e}") from e
+
+    if response.status_code >= 400:
+        message = f"HTTP {response.status_code}: {response.text[:200]}"
+        response.close()
+        if response.status_code == 429:
+            error = LLMRateLimitError(message, response.status_code)
+            error.retry_after = parse_retry_after(response)
+            raise error
+        raise LLMHTTPError(message, response.status_code)
+    return response
+
+def is_retryable(error):
+    """判断错误是否值得重试"""
+    if isinstance(error, LLMHTTPError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (LLMTimeoutError, LLMConnectionError))
+
+def with_retries(send, retries=None, attempts=None):
+    """执行send()，可重试的错误按指数退避重试，重试耗尽或不可重试时抛出最后一次的错误
+
+    attempts为可选的dict，其中的retries记录实际重试的次数。
+    """
+    retries = app.config.get('API_MAX_RETRIES', 3) if retries is None else retries
+    for attempt in range(retries + 1):
+        if attempts is not None:
+            attempts['retries'] = attempt
+        try:
+            return send()
+        except LLMError as e:
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = get_backoff_delay(attempt, getattr(e, 'retry_after', None))
+            print(f"大模型调用失败 (第 {attempt + 1}/{retries + 1} 次): {e}，{delay:.1f}秒后重试")
+            time.sleep(delay)
+
+def read_usage(usage):
+    """从响应的usage中读取 (提示词tokens, 输出tokens, 缓存命中tokens)
+
+    DeepSeek返回prompt_cache_hit_tokens，OpenAI兼容接口返回prompt_tokens_details.cached_tokens。
+    """
+    usage = usage or {}
+    cache_hit = usage.get('prompt_cache_hit_tokens')
+    if cache_hit is None:
+        cache_hit = (usage.get('prompt_tokens_details') or {}).get('cached_tokens')
+    return usage.get('prompt_tokens'), usage.get('completion_tokens'), cache_hit
+
+def record_call(context, model, started, retries, outcome, usage=None, error=None):
+    """记录一次大模型调用的用量和耗时，context为 {stage, doc_id, batch_index}
+
+    在独立的应用上下文中提交，不会提交调用方会话中未完成的修改；记录失败不影响调用结果。
+    """
+    if not app.config.get('LLM_CALL_LOGGING', True):
+        return
+    context = context or {}
+    prompt_tokens, completion_tokens, cache_hit_tokens = read_usage(usage)
+    try:
+        with app.app_context():
+            db.session.add(LLMCall(
+                stage=context.get('stage'),
+                doc_id=context.get('doc_id'),
+                batch_index=context.get('batch_index'),
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                cache_hit_tokens=cache_hit_tokens,
+                latency_ms=(time.perf_counter() - started) * 1000,
+                retries=retries,
+                outcome=outcome,
+                error=error[:1000] if error else None
+            ))
+            db.session.commit()
+    except Exception as e:
+        print(f"记录大模型调用失败: {str(e)}")
+
+def request_chat_completion(prompt, system_prompt, max_tokens, temperature=0.3, model=None,
+                            api_key=None, api_url=None, timeout=None, retries=None, context=None):
+    """调用对话补全接口，返回完整的响应JSON（含usage）
+
+    context为 {stage, doc_id, batch_index}，随用量记录一起保存。
+    """
+    headers, data = build_chat_request(prompt, system_prompt, max_tokens, temperature, model, api_key)
+
+    def send():
+        response = post_chat(data, headers, api_url, timeout)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise LLMResponseError(f"响应不是合法的JSON: {response.text[:200]}") from e
+
+    attempts = {'retries': 0}
+    started = time.perf_counter()
+    try:
+        result = with_retries(send, retries, attempts)
+    except LLMError as e:
+        record_call(context, data['model'], started, attempts['retries'], type(e).__name__, error=str(e))
+        raise
+    record_call(context, data['model'], started, attempts['retries'], 'success', usage=result.get('usage'))
+    return result
+
+def chat_completion(prompt, system_prompt, max_tokens, temperature=0.3, model=None,
+                    api_key=None, api_url=None, timeout=None, retries=None, context=None):
+    """调用对话补全接口，返回生成的文本，失败时抛出LLMError子类"""
+    result = request_chat_completion(prompt, system_prompt, max_tokens, temperature, model,
+                                     api_key, api_url, timeout, retries, context)
+    try:
+        return result['choices'][0]['message']['content']
+    except (KeyError, IndexError, TypeError) as e:
+        raise LLMResponseError(f"响应缺少生成内容: {str(result)[:200]}") from e
+
+def chat_completion_stream(prompt, system_prompt, max_tokens, temperature=0.3, model=None,
+                           api_key=None, api_url=None, timeout=None, retries=None, context=None):
+    """以流式方式调用对话补全接口，逐段产出生成的文本
+
+    只在建立连接阶段重试，开始产出内容后出错直接抛出，避免重复产出。
+    输出因达到max_tokens被截断（finish_reason为length）时在产出全部内容后抛出LLMResponseError。
+    请求最后一个数据块附带usage，流结束（或中途出错）时记录本次调用。
+    """
+    headers, data = build_chat_request(prompt, system_prompt, max_tokens, temperature, model, api_key)
+    data['stream'] = True
+    data['stream_options'] = {'include_usage': True}
+
+    attempts = {'retries': 0}
+    started = time.perf_counter()
+    try:
+        response = with_retries(lambda: post_chat(data, headers, api_url, timeout, stream=True), retries, attempts)
+    except LLMError as e:
+        record_call(context, data['model'], started, attempts['retries'], type(e).__name__, error=str(e))
+        raise
+
+    usage = None
+    finish_reason = None
+    outcome, error = 'success', None
+    try:
+        for line in response.iter_lines():
+            line = line.decode('utf-8').strip()
+            if not line.startswith('data:'):
+                continue
+            payload = line[5:].strip()
+            if payload == '[DONE]':
+                break
+            try:
+                chunk = json.loads(payload)
+                choices = chunk.get('choices') or []
+                delta = (choices[0].get('delta') if choices else None) or {}
+            except (ValueError, AttributeError) as e:
+                raise LLMResponseError(f"流式响应格式错误: {payload[:200]}") from e
+            usage = chunk.get('usage') or usage
+            finish_reason = (choices[0].get('finish_reason') if choices else None) or finish_reason
+            if delta.get('content'):
+                yield delta['content']
+        if finish_reason == 'length':
+            raise LLMResponseError("输出达到max_tokens上限，内容被截断")
+    except requests.Timeout as e:
+        outcome, error = 'LLMTimeoutError', str(e)
+        raise LLMTimeoutError(f"读取流式响应超时: {e}") from e
+    except requests.RequestException as e:
+        outcome, error = 'LLMConnectionError', str(e)
+        raise LLMConnectionError(f"读取流式响应失败: {e}") from e
+    except LLMError as e:
+        outcome, error = type(e).__name__, str(e)
+        raise
+    except GeneratorExit:
+        outcome = 'cancelled'
+        raise
+    finally:
+        response.close()
+        record_call(context, data['model'], started, attempts['retries'], outcome, usage=usage, error=error)
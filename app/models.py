@@ -10,6 +10,8 @@ class Document(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     upload_time = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default='已上传')
+    text_hash = db.Column(db.String(32), nullable=True, index=True)  # 规范化文本内容的MD5
+    text_path = db.Column(db.String(500), nullable=True)  # 上传时提取的文本段落文件
     
     requirement_trees = db.relationship('RequirementTree', backref='document', lazy=True)
     validation_results = db.relationship('ValidationResult', backref='document', lazy=True)
@@ -17,12 +19,78 @@ class Document(db.Model):
 class RequirementTree(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     doc_id = db.Column(db.String(32), db.ForeignKey('document.id'), nullable=False)
-    tree_json = db.Column(db.JSON, nullable=False)
+    tree_json = db.Column(db.JSON, nullable=True)  # 旧记录直接保存需求树，新记录引用content_hash
+    content_hash = db.Column(db.String(64), nullable=True, index=True)  # 结果存储中的需求树哈希
+    overlay_json = db.Column(db.JSON, nullable=True)  # 本文档覆盖到共享结果上的字段，如根节点名称
     parse_time = db.Column(db.DateTime, default=datetime.utcnow)
 
 class ValidationResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     doc_id = db.Column(db.String(32), db.ForeignKey('document.id'), nullable=False)
-    result_json = db.Column(db.JSON, nullable=False)
+    result_json = db.Column(db.JSON, nullable=True)
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    overlay_json = db.Column(db.JSON, nullable=True)
+    match_options_json = db.Column(db.JSON, nullable=True)  # 验证时的规则相似度匹配阈值，未启用匹配时为{}，继续验证时沿用
     validate_time = db.Column(db.DateTime, default=datetime.utcnow)
-    model_used = db.Column(db.String(100), nullable=True)
\ No newline at end of file
+    model_used = db.Column(db.String(100), nullable=True)
+
+class Job(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # parse / validate
+    doc_id = db.Column(db.String(32), db.ForeignKey('document.id'), nullable=False, index=True)
+    params_json = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), default='queued', index=True)  # queued / running / succeeded / failed
+    progress = db.Column(db.Float, default=0.0)
+    message = db.Column(db.String(255), nullable=True)
+    result_json = db.Column(db.JSON, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    attempts = db.Column(db.Integer, default=0)
+    worker_id = db.Column(db.String(100), nullable=True)
+    created_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_time = db.Column(db.DateTime, nullable=True)
+    finished_time = db.Column(db.DateTime, nullable=True)
+    heartbeat_time = db.Column(db.DateTime, nullable=True)
+    depends_on = db.Column(db.String(32), nullable=True, index=True)  # 需等待该任务成功后才能领取
+
+class UploadSession(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    filename = db.Column(db.String(255), nullable=False)
+    file_type = db.Column(db.String(50), nullable=True)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received = db.Column(db.BigInteger, default=0)  # 已连续接收的字节数，即下一分片的偏移
+    hash_algorithm = db.Column(db.String(20), nullable=False)
+    file_hash = db.Column(db.String(32), nullable=True)  # 客户端声明的doc_id，完成时校验
+    temp_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), default='uploading')  # uploading / writing / completing / completed
+    doc_id = db.Column(db.String(32), nullable=True)
+    created_time = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class CacheEntry(db.Model):
+    namespace = db.Column(db.String(50), primary_key=True)  # 如 parse_text / validate_content
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.JSON, nullable=False)
+    updated_time = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class LLMCall(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    stage = db.Column(db.String(20), nullable=True, index=True)  # parse / validate
+    doc_id = db.Column(db.String(32), nullable=True, index=True)  # 不设外键，文档删除后仍保留用量记录
+    batch_index = db.Column(db.Integer, nullable=True)  # 章节序号或验证批次序号（从0开始）
+    model = db.Column(db.String(100), nullable=True)
+    prompt_tokens = db.Column(db.Integer, nullable=True)
+    completion_tokens = db.Column(db.Integer, nullable=True)
+    cache_hit_tokens = db.Column(db.Integer, nullable=True)  # 服务端前缀缓存命中的提示词token数
+    latency_ms = db.Column(db.Float, nullable=True)
+    retries = db.Column(db.Integer, default=0)
+    outcome = db.Column(db.String(50), nullable=False)  # success 或错误类型名
+    error = db.Column(db.Text, nullable=True)
+    created_time = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class ValidationCheckpoint(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    doc_id = db.Column(db.String(32), nullable=False, index=True)
+    content_hash = db.Column(db.String(64), nullable=False)  # 需求树内容哈希，需求树或匹配阈值变化后旧检查点不再使用
+    batch_index = db.Column(db.Integer, nullable=False)
+    results_json = db.Column(db.JSON, nullable=False)  # 该批大模型给出的节点结论
+    created_time = db.Column(db.DateTime, default=datetime.utcnow)
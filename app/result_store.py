@@ -0,0 +1,107 @@
+from app import app
+from app.models import db, RequirementTree, ValidationResult
+from datetime import datetime
+import hashlib
+import json
+import os
+import tempfile
+
+def compute_result_hash(obj):
+    """计算结果内容的SHA-256，作为内容寻址存储的键"""
+    content = json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def is_result_hash(value):
+    """判断缓存值是否为结果内容哈希（旧版缓存记录的是32位doc_id）"""
+    return isinstance(value, str) and len(value) == 64
+
+def get_result_path(content_hash):
+    """结果文件路径，按哈希前两位分目录"""
+    return os.path.join(app.config['RESULT_STORE_FOLDER'], content_hash[:2], f"{content_hash}.json")
+
+def put_result(obj):
+    """按内容哈希保存结果，相同内容只保存一份，返回内容哈希"""
+    content_hash = compute_result_hash(obj)
+    result_path = get_result_path(content_hash)
+    if os.path.exists(result_path):
+        return content_hash
+
+    folder = os.path.dirname(result_path)
+    os.makedirs(folder, exist_ok=True)
+    # 先写临时文件再原子替换，并发写入相同内容时不会读到半个文件
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, result_path)
+    return content_hash
+
+def get_result(content_hash):
+    """读取结果内容，不存在时返回None"""
+    result_path = get_result_path(content_hash)
+    if not os.path.exists(result_path):
+        return None
+    with open(result_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def apply_overlay(result, overlay):
+    """将文档自身的字段（如根节点名称）覆盖到共享结果上，只复制根节点"""
+    if not overlay or result is None:
+        return result
+    if isinstance(result, list):
+        return [{**result[0], **overlay}] + result[1:] if result else result
+    return {**result, **overlay}
+
+def tree_from_row(row):
+    """从RequirementTree记录还原需求树，兼容直接保存tree_json的旧记录"""
+    if row.content_hash:
+        return apply_overlay(get_result(row.content_hash), row.overlay_json)
+    return row.tree_json
+
+def validation_from_row(row):
+    """从ValidationResult记录还原验证结果，兼容直接保存result_json的旧记录"""
+    if row.content_hash:
+        return apply_overlay(get_result(row.content_hash), row.overlay_json)
+    return row.result_json
+
+def load_requirement_tree(doc_id):
+    """读取文档的需求树，不存在时返回None"""
+    row = RequirementTree.query.filter_by(doc_id=doc_id).first()
+    return tree_from_row(row) if row else None
+
+def load_validation_result(doc_id):
+    """读取文档最近一次的验证结果，不存在时返回None"""
+    row = ValidationResult.query.filter_by(doc_id=doc_id) \
+        .order_by(ValidationResult.validate_time.desc()).first()
+    return validation_from_row(row) if row else None
+
+def save_tree_ref(doc_id, content_hash, label):
+    """记录文档引用的需求树，根节点名称作为覆盖字段单独保存"""
+    row = RequirementTree.query.filter_by(doc_id=doc_id).first()
+    if row is None:
+        row = RequirementTree(doc_id=doc_id)
+        db.session.add(row)
+    row.content_hash = content_hash
+    row.overlay_json = {'label': label}
+    row.tree_json = None
+    row.parse_time = datetime.utcnow()
+    return row
+
+def load_validation_match_options(doc_id):
+    """读取文档最近一次验证使用的规则相似度匹配阈值，未启用匹配时为{}，没有记录时返回None"""
+    row = ValidationResult.query.filter_by(doc_id=doc_id) \
+        .order_by(ValidationResult.validate_time.desc()).first()
+    return row.match_options_json if row else None
+
+def save_validation_ref(doc_id, content_hash, root_name, model_used, match_options=None):
+    """记录文档引用的验证结果及所用的规则相似度匹配阈值，根节点名称作为覆盖字段单独保存"""
+    row = ValidationResult.query.filter_by(doc_id=doc_id).first()
+    if row is None:
+        row = ValidationResult(doc_id=doc_id)
+        db.session.add(row)
+    row.content_hash = content_hash
+    row.overlay_json = {'name': root_name}
+    row.result_json = None
+    row.match_options_json = match_options or {}
+    row.model_used = model_used
+    row.validate_time = datetime.utcnow()
+    return row
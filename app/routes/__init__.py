@@ -1,12 +1,18 @@
 from app import app
 from app.routes.upload import upload_bp
+from app.routes.upload_sessions import upload_sessions_bp
 from app.routes.parse import parse_bp
 from app.routes.validate import validate_bp
 from app.routes.export import export_bp
 from app.routes.history import history_bp
+from app.routes.jobs import jobs_bp
+from app.routes.usage import usage_bp
 
 app.register_blueprint(upload_bp)
+app.register_blueprint(upload_sessions_bp)
 app.register_blueprint(parse_bp)
 app.register_blueprint(validate_bp)
 app.register_blueprint(export_bp)
 app.register_blueprint(history_bp)
+app.register_blueprint(jobs_bp)
+app.register_blueprint(usage_bp)
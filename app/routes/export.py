@@ -1,6 +1,5 @@
-from flask import Blueprint, request, jsonify, send_file
-from app import app
-from app.models import RequirementTree, ValidationResult
+from flask import Blueprint, jsonify
+from app.result_store import load_requirement_tree, load_validation_result
 import os
 import json
 
@@ -16,35 +15,11 @@ def export_requirements(doc_id):
     if not doc_id:
         return jsonify({'error': 'doc_id is required'}), 400
     
-    req_tree = None
+    req_tree = load_requirement_tree(doc_id)
+    if req_tree is None:
+        return jsonify({'error': 'Requirement tree not found'}), 404
     
-    parse_json_file = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), 
-        'parse_results', 
-        f'{doc_id}.json'
-    )
-    
-    if os.path.exists(parse_json_file):
-        with open(parse_json_file, 'r', encoding='utf-8') as f:
-            req_tree = json.load(f)
-    
-    if not req_tree:
-        requirement_tree = RequirementTree.query.filter_by(doc_id=doc_id).first()
-        if not requirement_tree:
-            return jsonify({'error': 'Requirement tree not found'}), 404
-        req_tree = requirement_tree.tree_json
-    
-    validation_results = None
-    validation_file = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)), 
-        '..', 
-        'validate_results', 
-        f'validation_{doc_id}.json'
-    )
-    
-    if os.path.exists(validation_file):
-        with open(validation_file, 'r', encoding='utf-8') as f:
-            validation_results = json.load(f)
+    validation_results = load_validation_result(doc_id)
     
     validation_map = {}
     if validation_results:
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from app.models import Document, RequirementTree, ValidationResult
+from app.result_store import tree_from_row, validation_from_row
 
 history_bp = Blueprint('history', __name__)
 
@@ -27,11 +28,11 @@ def get_document_detail(doc_id):
     
     # 获取需求树
     trees = RequirementTree.query.filter_by(doc_id=doc_id).all()
-    trees_data = [{'id': t.id, 'parse_time': t.parse_time.isoformat(), 'tree_json': t.tree_json} for t in trees]
+    trees_data = [{'id': t.id, 'parse_time': t.parse_time.isoformat(), 'tree_json': tree_from_row(t)} for t in trees]
     
     # 获取验证结果
     results = ValidationResult.query.filter_by(doc_id=doc_id).all()
-    results_data = [{'id': r.id, 'validate_time': r.validate_time.isoformat(), 'result_json': r.result_json} for r in results]
+    results_data = [{'id': r.id, 'validate_time': r.validate_time.isoformat(), 'result_json': validation_from_row(r)} for r in results]
     
     return jsonify({
         'document': {
@@ -0,0 +1,66 @@
+from flask import Blueprint, request, jsonify
+from app.models import db, Document, Job
+from app.jobs import JOB_KINDS, enqueue_job, job_to_dict
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('/api/jobs/<kind>/<doc_id>', methods=['POST'])
+def submit_job(kind, doc_id):
+    """提交解析或验证任务，由后台工作进程执行"""
+    if kind not in JOB_KINDS:
+        return jsonify({'error': f'Unknown job kind: {kind}'}), 400
+
+    document = Document.query.filter_by(id=doc_id).first()
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
+
+    params = {}
+    if kind == 'parse':
+        params['use_llm'] = request.args.get('use_llm', 'false').lower() == 'true'
+
+    # 同一文档已有未完成的同类任务时直接返回该任务
+    job = Job.query.filter(
+        Job.kind == kind,
+        Job.doc_id == doc_id,
+        Job.status.in_(['queued', 'running'])
+    ).first()
+    if not job:
+        job = enqueue_job(kind, doc_id, params)
+
+    return jsonify({
+        **job_to_dict(job),
+        'status_url': f'/api/jobs/{job.id}',
+        'result_url': f'/api/jobs/{job.id}/result'
+    }), 202
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态和进度"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_to_dict(job))
+
+@jobs_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """获取任务结果，任务未完成时返回202"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+
+    if job.status == 'succeeded':
+        return jsonify(job.result_json)
+    if job.status == 'failed':
+        return jsonify({'error': job.error, 'job': job_to_dict(job)}), 500
+    return jsonify(job_to_dict(job)), 202
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """按文档或状态筛选任务列表"""
+    query = Job.query
+    if request.args.get('doc_id'):
+        query = query.filter_by(doc_id=request.args['doc_id'])
+    if request.args.get('status'):
+        query = query.filter_by(status=request.args['status'])
+    jobs = query.order_by(Job.created_time.desc()).limit(100).all()
+    return jsonify({'jobs': [job_to_dict(job) for job in jobs]})
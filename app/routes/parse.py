@@ -1,32 +1,31 @@
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from app import app
 from app.models import db, Document as DocModel, RequirementTree
+from app.document_text import load_text_artifact, compute_text_hash
+from app.llm_client import LLMError, LLMResponseError, chat_completion, chat_completion_stream
+from app.cache_store import cache_get, cache_put, cache_clear, cache_page, import_json_cache_index
+from app.result_store import (
+    put_result, get_result, get_result_path, is_result_hash, apply_overlay,
+    tree_from_row, load_requirement_tree, save_tree_ref
+)
 import os
 import re
 import json
-import requests
 import hashlib
-from docx import Document
+from concurrent.futures import ThreadPoolExecutor
 
 parse_bp = Blueprint('parse', __name__)
 
 PARSE_OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'parse_results')
-CACHE_INDEX_FILE = os.path.join(PARSE_OUTPUT_FOLDER, 'cache_index.json')
+CACHE_INDEX_FILE = os.path.join(PARSE_OUTPUT_FOLDER, 'cache_index.json')  # 旧版缓存索引，启动时导入缓存表
 
-if not os.path.exists(PARSE_OUTPUT_FOLDER):
-    os.makedirs(PARSE_OUTPUT_FOLDER)
+# 文本哈希 -> 结果存储中的需求树哈希（旧版记录的是doc_id）
+PARSE_CACHE_NAMESPACE = 'parse_text'
+# 章节哈希（章节文本、模型和输出格式）-> 结果存储中该章节解析出的子树列表哈希
+PARSE_CHAPTER_NAMESPACE = 'parse_chapter'
 
-def load_cache_index():
-    """加载缓存索引"""
-    if os.path.exists(CACHE_INDEX_FILE):
-        with open(CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def save_cache_index(cache_index):
-    """保存缓存索引"""
-    with open(CACHE_INDEX_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache_index, f, ensure_ascii=False, indent=2)
+with app.app_context():
+    import_json_cache_index(PARSE_CACHE_NAMESPACE, CACHE_INDEX_FILE)
 
 def compute_file_hash(filepath):
     """计算文件的MD5哈希值"""
@@ -36,72 +35,260 @@ def compute_file_hash(filepath):
             hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
-def compute_text_hash(filepath):
-    """计算文档文本内容的MD5哈希值（更准确检测相同文档）"""
-    text = extract_text_from_docx(filepath)
-    hash_md5 = hashlib.md5()
-    hash_md5.update(text.encode('utf-8'))
-    return hash_md5.hexdigest()
+HEADING_STYLE_PATTERN = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+NUMBERED_TITLE_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)\.?[\s\u3000]*(\D.{0,49})$')
+TOC_LINE_PATTERN = re.compile(r'(\t|\.{3,}|…+)\s*\d+$')
+TITLE_END_PUNCTUATION = ('。', '；', ';', '：', ':', '，', ',')
+MIN_HEADING_COUNT = 3
 
-def extract_text_from_docx(filepath):
-    doc = Document(filepath)
-    text_lines = []
-    for para in doc.paragraphs:
-        text = para.text.strip()
-        if text:
-            text_lines.append(text)
-    return '\n'.join(text_lines)
-
-def compute_text_hash(text):
-    """计算文本内容的MD5哈希值"""
-    hash_md5 = hashlib.md5()
-    hash_md5.update(text.encode('utf-8'))
-    return hash_md5.hexdigest()
+def is_toc_paragraph(para):
+    """判断段落是否为目录项"""
+    return (para['style'] or '').lower().startswith('toc')
+
+def get_heading_level(para):
+    """根据标题样式或大纲级别获取段落的标题层级，正文和表格中的段落返回None"""
+    if para.get('in_table'):
+        return None
+    match = HEADING_STYLE_PATTERN.match(para['style'] or '')
+    if match:
+        return int(match.group(1))
+    return para.get('outline_level')
 
-def call_llm_api(prompt, model, api_key, api_url, retries=3):
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {api_key}'
+def locate_styled_headings(paragraphs):
+    """按标题样式或大纲级别定位标题，返回 {段落序号: (层级, 标题)}"""
+    headings = {}
+    counters = []
+    prev_level = 0
+    for idx, para in enumerate(paragraphs):
+        level = get_heading_level(para)
+        if not level:
+            continue
+        # 层级跳跃（如一级标题下直接出现三级标题）视为结构不明确
+        if level > prev_level + 1:
+            return None
+        prev_level = level
+        
+        counters = counters[:level]
+        if len(counters) < level:
+            counters.append(0)
+        counters[-1] += 1
+        
+        title = para['text']
+        # 自动编号的标题文本中不含编号，按层级计数补全
+        if para.get('numbered') and not title[0].isdigit():
+            title = f"{'.'.join(str(c) for c in counters)} {title}"
+        headings[idx] = (level, title)
+    return headings
+
+def is_next_title_number(prev, number):
+    """判断标题编号是否为上一个标题编号的合法后继（同级递增、进入下级或回到上级）"""
+    if prev is None:
+        return number == (1,)
+    if number == prev + (1,):
+        return True
+    depth = len(number)
+    return depth <= len(prev) and number[:-1] == prev[:depth - 1] and number[-1] == prev[depth - 1] + 1
+
+def locate_numbered_headings(paragraphs):
+    """按文本中的标题编号（如1.1、3.2.4）定位标题，返回 {段落序号: (层级, 标题)}"""
+    headings = {}
+    prev = None
+    for idx, para in enumerate(paragraphs):
+        text = para['text']
+        if para.get('in_table') or TOC_LINE_PATTERN.search(text) or text.endswith(TITLE_END_PUNCTUATION):
+            continue
+        match = NUMBERED_TITLE_PATTERN.match(text)
+        if not match:
+            continue
+        number = tuple(int(part) for part in match.group(1).split('.'))
+        if not is_next_title_number(prev, number):
+            continue
+        prev = number
+        headings[idx] = (len(number), f"{match.group(1)} {match.group(2).strip()}")
+    return headings
+
+def new_root_node(label):
+    """创建需求树根节点"""
+    return {
+        'id': 'root',
+        'label': label,
+        'content': None,
+        'level': 0,
+        'v_status': True,
+        'e_status': 'pending',
+        'children': []
     }
+
+def build_tree_from_headings(paragraphs, label):
+    """根据标题样式和标题编号在本地构建需求树，结构不明确时返回None"""
+    body = [p for p in paragraphs if not is_toc_paragraph(p)]
     
-    data = {
-        'model': model,
-        'messages': [
-            {
-                'role': 'system',
-                'content': '你是一个专业的需求文档分析助手，擅长解析软件需求规格说明书。'
-            },
-            {
-                'role': 'user',
-                'content': prompt
-            }
-        ],
-        'temperature': 0.3,
-        'max_tokens': 8000
-    }
+    headings = locate_styled_headings(body)
+    if headings is None:
+        return None
+    if len(headings) < MIN_HEADING_COUNT:
+        headings = locate_numbered_headings(body)
+    if len(headings) < MIN_HEADING_COUNT:
+        return None
     
-    for attempt in range(retries):
-        try:
-            session = requests.Session()
-            response = session.post(
-                api_url + '/chat/completions',
-                headers=headers,
-                json=data,
-                timeout=120
-            )
-            response.raise_for_status()
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        except Exception as e:
-            print(f"API调用失败 (尝试 {attempt+1}/{retries}): {str(e)}")
-            if attempt < retries - 1:
-                import time
-                time.sleep(2)
+    root = new_root_node(label)
+    stack = [root]
+    content_lines = None
     
-    return None
+    for idx, para in enumerate(body):
+        if idx not in headings:
+            # 第一个标题之前的封面、目录等内容不计入需求树
+            if content_lines is not None:
+                content_lines.append(para['text'])
+            continue
+        
+        level, title = headings[idx]
+        del stack[level:]
+        parent = stack[-1]
+        prefix = 'node' if parent['id'] == 'root' else parent['id']
+        content_lines = []
+        node = {
+            'id': f"{prefix}_{len(parent['children']) + 1}",
+            'label': title,
+            'content': content_lines,
+            'level': level,
+            'v_status': True,
+            'e_status': 'pass',
+            'children': []
+        }
+        parent['children'].append(node)
+        stack.append(node)
+    
+    def finalize(node):
+        if node['id'] != 'root':
+            node['content'] = '\n'.join(node['content']) or None
+        for child in node['children']:
+            finalize(child)
+        if not node['children'] and node['id'] != 'root':
+            node['children'] = None
+    
+    finalize(root)
+    return root
 
-def parse_document_with_llm(text):
-    prompt = f"""请解析以下软件需求规格说明文档，识别出所有标题和对应的内容。
+PARSE_SYSTEM_PROMPT = '你是一个专业的需求文档分析助手，擅长解析软件需求规格说明书。'
+PARSE_MAX_TOKENS = 8000
+
+def call_parse_llm(prompt, context=None):
+    """调用大模型解析文档，失败时返回None；context为用量记录的 {stage, doc_id, batch_index}"""
+    try:
+        return chat_completion(
+            prompt, PARSE_SYSTEM_PROMPT, PARSE_MAX_TOKENS,
+            timeout=app.config.get('PARSE_API_TIMEOUT', 120),
+            context=context
+        )
+    except LLMError as e:
+        print(f"大模型解析调用失败: {type(e).__name__}: {str(e)}")
+        return None
+
+def iter_stream_nodes(chunks):
+    """增量扫描大模型流式输出的JSON，每当一个节点对象闭合时立即产出 (位置路径, 节点)
+    
+    位置路径为节点在各级children中的序号（从1开始），根节点的路径为空，不产出。
+    同时支持完整格式 {"tree": {...}} 和紧凑格式的顶层节点数组。
+    流结束时顶层数组或对象仍未闭合（如达到max_tokens或连接中断）时抛出LLMResponseError，
+    此前产出的节点只是部分结果。
+    """
+    text = ''
+    pos = 0
+    in_string = False
+    escaped = False
+    # 每项为 [括号, 起始位置, 位置路径, 已出现的子对象数]
+    stack = []
+    closed = False
+    
+    for chunk in chunks:
+        text += chunk
+        while pos < len(text):
+            ch = text[pos]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in '{[':
+                path = None
+                if ch == '{' and stack:
+                    container = stack[-1]
+                    if container[0] == '[' and len(stack) == 1:
+                        # 紧凑格式顶层数组中的对象：一级节点
+                        container[3] += 1
+                        path = [container[3]]
+                    elif container[0] == '[' and len(stack) > 1 and stack[-2][2] is not None:
+                        # children数组中的对象：父节点路径 + 序号
+                        container[3] += 1
+                        path = stack[-2][2] + [container[3]]
+                    elif container[0] == '{' and container[2] is None:
+                        # {"tree": {...}} 中的根节点
+                        path = []
+                stack.append([ch, pos, path, 0])
+            elif ch in '}]' and stack:
+                bracket, start, path, _ = stack.pop()
+                closed = closed or not stack
+                if bracket == '{' and path:
+                    try:
+                        node = json.loads(text[start:pos + 1])
+                    except ValueError:
+                        node = None
+                    if isinstance(node, dict):
+                        yield path, node
+            pos += 1
+    
+    if stack or not closed:
+        raise LLMResponseError(f"大模型输出的JSON不完整，可能因达到输出上限或连接中断被截断: {text[-200:]}")
+
+def build_compact_parse_prompt(text):
+    """构造紧凑输出格式的解析提示词，省略可在本地补全的字段以减少输出token"""
+    return f"""请解析以下软件需求规格说明文档，识别出所有标题和对应的内容。
+
+请严格按照以下紧凑JSON格式返回，不要缩进和换行，不要包含任何其他内容：
+[{{"t":"标题名称","n":[{{"t":"子标题名称","c":"子标题下的内容"}}]}}]
+
+字段说明：
+- t: 标题名称
+- c: 该标题下的具体内容，没有内容时省略
+- n: 子标题数组，没有子标题时省略
+
+要求：
+1. 根据标题编号确定层级关系（如1是一级，1.1是二级，1.1.1是三级）
+2. 只在叶子节点（非标题节点）填写c，父标题节点省略c
+3. 返回纯JSON格式，不要有markdown代码块标记
+4. 文档内容：
+
+{text}
+
+请返回JSON："""
+
+def expand_compact_node(node):
+    """将紧凑格式的节点展开为完整的需求树节点，id和level由assign_node_ids补全"""
+    if 'label' in node:
+        return node
+    children = [expand_compact_node(child) for child in node.get('n') or []]
+    return {
+        'id': None,
+        'label': node.get('t', ''),
+        'content': node.get('c'),
+        'level': None,
+        'v_status': True,
+        'e_status': 'pass',
+        'children': children or None
+    }
+
+def build_parse_prompt(text, compact=None):
+    """构造解析文档的提示词，compact为None时按PARSE_COMPACT_SCHEMA配置选择输出格式"""
+    if compact is None:
+        compact = app.config.get('PARSE_COMPACT_SCHEMA', True)
+    if compact:
+        return build_compact_parse_prompt(text)
+    return f"""请解析以下软件需求规格说明文档，识别出所有标题和对应的内容。
 
 请严格按照以下JSON格式返回，不要包含任何其他内容：
 {{
@@ -146,11 +333,14 @@ def parse_document_with_llm(text):
 
 请返回JSON："""
 
-    model = app.config.get('API_MODEL_DEFAULT', 'deepseek-chat')
-    api_key = app.config.get('API_KEY_DEFAULT')
-    api_url = app.config.get('API_URL_DEFAULT', 'https://api.deepseek.com')
-    
-    response = call_llm_api(prompt, model, api_key, api_url)
+def expand_parse_result(result):
+    """将紧凑格式的节点数组展开为 {"tree": {...}}，完整格式原样返回"""
+    if isinstance(result, list):
+        return {'tree': {'children': [expand_compact_node(node) for node in result if isinstance(node, dict)]}}
+    return result
+
+def parse_document_with_llm(text, context=None):
+    response = call_parse_llm(build_parse_prompt(text), context)
     
     if response:
         response = response.strip()
@@ -164,17 +354,17 @@ def parse_document_with_llm(text):
         
         try:
             result = json.loads(response)
-            return result
+            return expand_parse_result(result)
         except json.JSONDecodeError as e:
             print(f"JSON解析失败: {str(e)}")
             print(f"尝试修复截断的JSON...")
             
-            match = re.search(r'\{[\s\S]*\}', response)
+            match = re.search(r'\[[\s\S]*\]' if response.startswith('[') else r'\{[\s\S]*\}', response)
             if match:
                 try:
                     result = json.loads(match.group(0))
                     print("JSON修复成功!")
-                    return result
+                    return expand_parse_result(result)
                 except:
                     pass
             
@@ -182,163 +372,395 @@ def parse_document_with_llm(text):
     
     return None
 
-def save_json_to_file(doc_id, tree):
-    output_filename = f"{doc_id}.json"
-    output_path = os.path.join(PARSE_OUTPUT_FOLDER, output_filename)
+def split_into_chapters(paragraphs):
+    """按一级章节切分文档，返回各章节的文本列表"""
+    body = [p for p in paragraphs if not is_toc_paragraph(p)]
+    starts = [idx for idx, para in enumerate(body) if get_heading_level(para) == 1]
+    if len(starts) < 2:
+        headings = locate_numbered_headings(body)
+        starts = sorted(idx for idx, (level, _) in headings.items() if level == 1)
+    if len(starts) < 2:
+        return ['\n'.join(p['text'] for p in body)]
+    
+    # 第一章之前的封面、目录等内容不参与解析
+    chapters = []
+    for n, start in enumerate(starts):
+        end = starts[n + 1] if n + 1 < len(starts) else len(body)
+        lines = [p['text'] for p in body[start:end]]
+        # 自动编号的章标题文本中不含编号，补全后便于大模型确定层级
+        if not lines[0][0].isdigit():
+            lines[0] = f"{n + 1} {lines[0]}"
+        chapters.append('\n'.join(lines))
+    return chapters
+
+def assign_node_ids(node, node_id='root', level=0):
+    """按节点位置重新分配稳定的node_编号和层级"""
+    node['id'] = node_id
+    node['level'] = level
+    prefix = 'node' if node_id == 'root' else node_id
+    for idx, child in enumerate(node.get('children') or [], 1):
+        assign_node_ids(child, f"{prefix}_{idx}", level + 1)
+
+def compute_chapter_hash(chapter):
+    """章节缓存的键，包含模型和输出格式，切换后不复用按原配置解析的子树"""
+    key_str = json.dumps({
+        'text': chapter,
+        'model': app.config.get('API_MODEL_DEFAULT', 'deepseek-chat'),
+        'compact': app.config.get('PARSE_COMPACT_SCHEMA', True)
+    }, sort_keys=True, ensure_ascii=False)
+    return compute_text_hash(key_str)
+
+def load_cached_chapter(chapter_hash):
+    """读取章节缓存的子树列表，未命中时返回None"""
+    result_hash = cache_get(PARSE_CHAPTER_NAMESPACE, chapter_hash)
+    return get_result(result_hash) if result_hash else None
+
+def save_cached_chapter(chapter_hash, children):
+    """缓存章节解析出的子树列表"""
+    cache_put(PARSE_CHAPTER_NAMESPACE, chapter_hash, put_result(children))
+
+def parse_chapters_with_llm(paragraphs, label, doc_id=None):
+    """按一级章节分块解析，再将各章节子树拼接到根节点下，返回 (需求树, 章节统计)
+    
+    内容未变的章节直接复用缓存的子树，只有新增或修改过的章节并发调用大模型。
+    """
+    chapters = split_into_chapters(paragraphs)
+    chapter_hashes = [compute_chapter_hash(chapter) for chapter in chapters]
+    subtrees = [load_cached_chapter(chapter_hash) for chapter_hash in chapter_hashes]
+    pending = [idx for idx, subtree in enumerate(subtrees) if subtree is None]
+    sections = {
+        'total': len(chapters),
+        'reused': len(chapters) - len(pending),
+        'reparsed': len(pending)
+    }
+    max_workers = app.config.get('PARSE_MAX_WORKERS', 4)
+    print(f"文档切分为 {len(chapters)} 个章节，复用 {sections['reused']} 个，"
+          f"需解析 {len(pending)} 个，并发数 {max_workers}")
+    
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                parse_document_with_llm,
+                [chapters[idx] for idx in pending],
+                [{'stage': 'parse', 'doc_id': doc_id, 'batch_index': idx} for idx in pending]
+            ))
+        
+        # 先缓存解析成功的章节，部分章节失败时重试只需解析失败的章节
+        for idx, result in zip(pending, results):
+            if result and 'tree' in result:
+                subtrees[idx] = result['tree'].get('children') or []
+                if subtrees[idx]:
+                    save_cached_chapter(chapter_hashes[idx], subtrees[idx])
+    
+    root = new_root_node(label)
+    for idx, subtree in enumerate(subtrees):
+        if subtree is None:
+            print(f"第 {idx + 1} 个章节解析失败")
+            return None, sections
+        root['children'].extend(subtree)
+    
+    assign_node_ids(root)
+    return root, sections
+
+def save_requirement_tree(doc_id, document, req_tree):
+    """将需求树写入结果存储并记录文档引用，返回内容哈希"""
+    content_hash = put_result(req_tree)
+    save_tree_ref(doc_id, content_hash, req_tree.get('label'))
+    
+    if document:
+        document.status = '已解析'
+    
+    db.session.commit()
+    return content_hash
+
+def parse_response(req_tree, content_hash, cached, parse_method, sections=None):
+    """构造解析接口的响应数据，sections为按章节解析时的复用统计"""
+    response = {
+        'requirement_tree': req_tree,
+        'content_hash': content_hash,
+        'output_file': get_result_path(content_hash) if content_hash else None,
+        'cached': cached,
+        'parse_method': parse_method
+    }
+    if sections is not None:
+        response['sections'] = sections
+    return response
+
+def load_cached_parse(doc_id, document, text_hash):
+    """查找相同内容文档的解析结果，命中时只为当前doc_id记录引用，不复制结果"""
+    content_hash = cache_get(PARSE_CACHE_NAMESPACE, text_hash)
+    if content_hash is None:
+        return None
+    
+    if not is_result_hash(content_hash):
+        # 旧版缓存记录的是doc_id，转换为结果哈希
+        legacy_tree = load_requirement_tree(content_hash)
+        if legacy_tree is None:
+            return None
+        content_hash = put_result(legacy_tree)
+        cache_put(PARSE_CACHE_NAMESPACE, text_hash, content_hash)
+    
+    req_tree = get_result(content_hash)
+    if req_tree is None:
+        return None
     
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(tree, f, ensure_ascii=False, indent=2)
+    print(f"发现相同文档，引用已缓存的需求树: {content_hash}")
     
-    return output_path
+    # 当前文档名作为覆盖字段保存
+    save_tree_ref(doc_id, content_hash, document.filename)
+    document.status = '已解析'
+    db.session.commit()
+    
+    return parse_response(apply_overlay(req_tree, {'label': document.filename}), content_hash, True, 'cache')
+
+def load_existing_parse(doc_id):
+    """读取当前doc_id已有的解析结果"""
+    row = RequirementTree.query.filter_by(doc_id=doc_id).first()
+    if not row:
+        return None
+    req_tree = tree_from_row(row)
+    if req_tree is None:
+        return None
+    return parse_response(req_tree, row.content_hash, True, 'cache')
 
 @parse_bp.route('/api/parse/<doc_id>', methods=['GET'])
 def parse_document(doc_id):
     if not doc_id:
         return jsonify({'error': 'doc_id is required'}), 400
     
+    use_llm = request.args.get('use_llm', 'false').lower() == 'true'
+    body, status = run_parse(doc_id, use_llm)
+    return jsonify(body), status
+
+def run_parse(doc_id, use_llm=False):
+    """解析文档并保存需求树，返回 (响应数据, 状态码)"""
     # 检查是否已有解析结果
-    existing_json = os.path.join(PARSE_OUTPUT_FOLDER, f"{doc_id}.json")
-    if os.path.exists(existing_json):
-        with open(existing_json, 'r', encoding='utf-8') as f:
-            req_tree = json.load(f)
-        return jsonify({
-            'requirement_tree': req_tree,
-            'output_file': existing_json,
-            'cached': True
-        })
+    existing = load_existing_parse(doc_id)
+    if existing:
+        return existing, 200
     
     document = DocModel.query.filter_by(id=doc_id).first()
     if not document:
-        return jsonify({'error': 'Document not found'}), 404
-    
-    filepath = document.file_path
-    if not os.path.exists(filepath):
-        return jsonify({'error': 'File not found on disk'}), 404
+        return {'error': 'Document not found'}, 404
     
-    # 计算文档文本内容的哈希
-    text_hash = compute_text_hash(filepath)
+    # 读取上传时提取的文本，不再重复打开原始文档
+    artifact = load_text_artifact(document)
+    if artifact is None:
+        return {'error': 'File not found on disk'}, 404
+    paragraphs, text_hash = artifact
     print(f"文档内容哈希: {text_hash}")
     
-    # 检查缓存
-    cache_index = load_cache_index()
-    
     # 如果有相同的文档被解析过，直接返回缓存结果
-    if text_hash in cache_index:
-        cached_doc_id = cache_index[text_hash]
-        cached_json = os.path.join(PARSE_OUTPUT_FOLDER, f"{cached_doc_id}.json")
-        if os.path.exists(cached_json):
-            print(f"发现相同文档，已缓存 doc_id: {cached_doc_id}")
-            
-            # 复制缓存结果到新的doc_id
-            with open(cached_json, 'r', encoding='utf-8') as f:
-                req_tree = json.load(f)
-            
-            # 更新label为当前文档名
-            req_tree['label'] = document.filename
-            
-            output_path = save_json_to_file(doc_id, req_tree)
-            
-            # 检查是否已有RequirementTree记录
-            existing_tree = RequirementTree.query.filter_by(doc_id=doc_id).first()
-            if existing_tree:
-                # 更新现有记录
-                existing_tree.tree_json = req_tree
-            else:
-                # 创建新记录
-                tree = RequirementTree(
-                    doc_id=doc_id,
-                    tree_json=req_tree
-                )
-                db.session.add(tree)
-            
-            if document:
-                document.status = '已解析'
-            
-            db.session.commit()
-            
-            return jsonify({
-                'requirement_tree': req_tree,
-                'output_file': output_path,
-                'cached': True,
-                'cached_from': cached_doc_id
-            })
-    
-    print("正在使用大模型API解析文档...")
-    text = extract_text_from_docx(filepath)
-    result = parse_document_with_llm(text)
-    
-    if result and 'tree' in result:
-        req_tree = result['tree']
-        print("大模型解析成功")
-    else:
-        return jsonify({'error': '大模型解析失败，请检查API配置或网络连接'}), 500
-    
-    output_path = save_json_to_file(doc_id, req_tree)
-    print(f"JSON已保存到: {output_path}")
+    cached = load_cached_parse(doc_id, document, text_hash)
+    if cached:
+        return cached, 200
+    
+    req_tree = None
+    parse_method = 'llm'
+    sections = None
+    
+    # 优先按标题样式和编号在本地构建需求树，结构不明确时再调用大模型
+    if not use_llm:
+        req_tree = build_tree_from_headings(paragraphs, document.filename)
+        if req_tree:
+            parse_method = 'heading'
+            print("已根据标题样式在本地构建需求树")
+    
+    if req_tree is None:
+        print("正在使用大模型API解析文档...")
+        req_tree, sections = parse_chapters_with_llm(paragraphs, document.filename, doc_id)
+        
+        if req_tree:
+            print("大模型解析成功")
+        else:
+            return {'error': '大模型解析失败，请检查API配置或网络连接'}, 500
+    
+    content_hash = save_requirement_tree(doc_id, document, req_tree)
+    print(f"需求树已保存: {get_result_path(content_hash)}")
     
     # 更新缓存索引
-    cache_index[text_hash] = doc_id
-    save_cache_index(cache_index)
+    cache_put(PARSE_CACHE_NAMESPACE, text_hash, content_hash)
     
-    tree = RequirementTree(
-        doc_id=doc_id,
-        tree_json=req_tree
-    )
-    db.session.add(tree)
+    return parse_response(req_tree, content_hash, False, parse_method, sections), 200
+
+def ndjson_line(event):
+    """将事件序列化为一行NDJSON"""
+    return json.dumps(event, ensure_ascii=False) + '\n'
+
+def stream_node_event(node, node_id, parent_id, level):
+    """构造单个节点的流式事件（不含子节点）"""
+    return {
+        'type': 'node',
+        'node': {
+            'id': node_id,
+            'parent_id': parent_id,
+            'label': node.get('label'),
+            'content': node.get('content'),
+            'level': level,
+            'v_status': node.get('v_status', True),
+            'e_status': node.get('e_status', 'pass')
+        }
+    }
+
+def iter_tree_events(node, parent_id='root'):
+    """按先序遍历产出已构建需求树中各节点的流式事件"""
+    for child in node.get('children') or []:
+        yield stream_node_event(child, child['id'], parent_id, child['level'])
+        yield from iter_tree_events(child, child['id'])
+
+def iter_cached_chapter_events(nodes, prefix=(), offset=0):
+    """为复用缓存的章节子树按位置产出节点事件，offset为前面章节已产出的一级节点数"""
+    for idx, node in enumerate(nodes or [], offset + 1):
+        path = prefix + (idx,)
+        node_id = 'node_' + '_'.join(str(i) for i in path)
+        parent_id = 'node_' + '_'.join(str(i) for i in prefix) if prefix else 'root'
+        yield stream_node_event(node, node_id, parent_id, len(path))
+        yield from iter_cached_chapter_events(node.get('children'), path)
+
+@parse_bp.route('/api/parse/<doc_id>/stream', methods=['GET'])
+def parse_document_stream(doc_id):
+    """流式解析文档，以NDJSON逐行推送解析出的节点，最后推送完整需求树"""
+    existing = load_existing_parse(doc_id)
+    if existing:
+        return Response(ndjson_line({'type': 'done', **existing}), mimetype='application/x-ndjson')
     
-    if document:
-        document.status = '已解析'
+    document = DocModel.query.filter_by(id=doc_id).first()
+    if not document:
+        return jsonify({'error': 'Document not found'}), 404
     
-    db.session.commit()
+    artifact = load_text_artifact(document)
+    if artifact is None:
+        return jsonify({'error': 'File not found on disk'}), 404
+    paragraphs, text_hash = artifact
     
-    return jsonify({
-        'requirement_tree': req_tree,
-        'output_file': output_path,
-        'cached': False
-    })
+    use_llm = request.args.get('use_llm', 'false').lower() == 'true'
+    timeout = app.config.get('PARSE_API_TIMEOUT', 120)
+    
+    def generate():
+        cached = load_cached_parse(doc_id, document, text_hash)
+        if cached:
+            yield ndjson_line({'type': 'done', **cached})
+            return
+        
+        req_tree = None if use_llm else build_tree_from_headings(paragraphs, document.filename)
+        parse_method = 'heading'
+        sections = None
+        
+        if req_tree:
+            yield from (ndjson_line(event) for event in iter_tree_events(req_tree))
+        else:
+            parse_method = 'llm'
+            req_tree = new_root_node(document.filename)
+            chapters = split_into_chapters(paragraphs)
+            sections = {'total': len(chapters), 'reused': 0, 'reparsed': 0}
+            for chapter_idx, chapter in enumerate(chapters):
+                # 前面章节已产出的一级节点数，用于计算本章节点的全局序号
+                offset = len(req_tree['children'])
+                chapter_hash = compute_chapter_hash(chapter)
+                cached_children = load_cached_chapter(chapter_hash)
+                yield ndjson_line({
+                    'type': 'progress',
+                    'chapter': chapter_idx + 1,
+                    'total_chapters': len(chapters),
+                    'cached': cached_children is not None
+                })
+                
+                if cached_children is not None:
+                    sections['reused'] += 1
+                    yield from (ndjson_line(event) for event in iter_cached_chapter_events(cached_children, offset=offset))
+                    req_tree['children'].extend(cached_children)
+                    continue
+                
+                sections['reparsed'] += 1
+                chapter_nodes = []
+                try:
+                    chunks = chat_completion_stream(
+                        build_parse_prompt(chapter), PARSE_SYSTEM_PROMPT, PARSE_MAX_TOKENS, timeout=timeout,
+                        context={'stage': 'parse', 'doc_id': doc_id, 'batch_index': chapter_idx}
+                    )
+                    for path, node in iter_stream_nodes(chunks):
+                        node = expand_compact_node(node)
+                        path = [path[0] + offset] + path[1:]
+                        node_id = 'node_' + '_'.join(str(i) for i in path)
+                        parent_id = 'node_' + '_'.join(str(i) for i in path[:-1]) if len(path) > 1 else 'root'
+                        yield ndjson_line(stream_node_event(node, node_id, parent_id, len(path)))
+                        if len(path) == 1:
+                            chapter_nodes.append(node)
+                except LLMResponseError as e:
+                    # 输出被截断时已产出的节点不完整，不保存任何结果
+                    print(f"流式解析输出不完整: {str(e)}")
+                    yield ndjson_line({'type': 'error', 'error': '大模型输出不完整（可能达到输出上限），解析结果未保存'})
+                    return
+                except Exception as e:
+                    print(f"流式解析失败: {str(e)}")
+                    yield ndjson_line({'type': 'error', 'error': '大模型解析失败，请检查API配置或网络连接'})
+                    return
+                # 只有输出完整闭合、流正常结束的章节才并入需求树和章节缓存
+                req_tree['children'].extend(chapter_nodes)
+                if chapter_nodes:
+                    save_cached_chapter(chapter_hash, chapter_nodes)
+            
+            if not req_tree['children']:
+                yield ndjson_line({'type': 'error', 'error': '大模型解析失败，未解析出任何节点'})
+                return
+            assign_node_ids(req_tree)
+        
+        content_hash = save_requirement_tree(doc_id, document, req_tree)
+        cache_put(PARSE_CACHE_NAMESPACE, text_hash, content_hash)
+        
+        yield ndjson_line({'type': 'done', **parse_response(req_tree, content_hash, False, parse_method, sections)})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 @parse_bp.route('/api/parse/<doc_id>/download', methods=['GET'])
 def download_parse_result(doc_id):
-    output_filename = f"{doc_id}.json"
-    output_path = os.path.join(PARSE_OUTPUT_FOLDER, output_filename)
-    
-    if not os.path.exists(output_path):
+    req_tree = load_requirement_tree(doc_id)
+    if req_tree is None:
         return jsonify({'error': 'File not found'}), 404
     
-    return send_file(
-        output_path,
+    return Response(
+        json.dumps(req_tree, ensure_ascii=False, indent=2),
         mimetype='application/json',
-        as_attachment=True,
-        download_name=f"parse_result_{doc_id}.json"
+        headers={'Content-Disposition': f'attachment; filename=parse_result_{doc_id}.json'}
     )
 
 @parse_bp.route('/api/parse/results', methods=['GET'])
 def list_parse_results():
     files = []
-    for filename in os.listdir(PARSE_OUTPUT_FOLDER):
-        if filename.endswith('.json') and filename != 'cache_index.json':
-            filepath = os.path.join(PARSE_OUTPUT_FOLDER, filename)
-            files.append({
-                'filename': filename,
-                'doc_id': filename.replace('.json', ''),
-                'size': os.path.getsize(filepath),
-                'created_time': os.path.getctime(filepath)
-            })
+    for row in RequirementTree.query.order_by(RequirementTree.parse_time.desc()).all():
+        result_path = get_result_path(row.content_hash) if row.content_hash else None
+        files.append({
+            'filename': f"{row.doc_id}.json",
+            'doc_id': row.doc_id,
+            'content_hash': row.content_hash,
+            'size': os.path.getsize(result_path) if result_path and os.path.exists(result_path) else None,
+            'created_time': row.parse_time.timestamp() if row.parse_time else None
+        })
     return jsonify({'results': files})
 
 @parse_bp.route('/api/parse/cache/clear', methods=['POST'])
 def clear_cache():
-    """清除解析缓存"""
-    cache_index = load_cache_index()
-    cache_index.clear()
-    save_cache_index(cache_index)
-    return jsonify({'success': True, 'message': '缓存已清除'})
+    """清除解析缓存，包括按章节缓存的子树"""
+    deleted = cache_clear(PARSE_CACHE_NAMESPACE) + cache_clear(PARSE_CHAPTER_NAMESPACE)
+    return jsonify({'success': True, 'message': '缓存已清除', 'deleted': deleted})
 
 @parse_bp.route('/api/parse/cache/stats', methods=['GET'])
 def cache_stats():
-    """查看缓存统计"""
-    cache_index = load_cache_index()
+    """分页查看缓存统计"""
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+    total, entries = cache_page(PARSE_CACHE_NAMESPACE, page, per_page)
     return jsonify({
-        'cached_documents': len(cache_index),
-        'cache_index': cache_index
+        'cached_documents': total,
+        'page': page,
+        'per_page': per_page,
+        'pages': (total + per_page - 1) // per_page,
+        'entries': [
+            {
+                'text_hash': entry.key,
+                'content_hash': entry.value,
+                'updated_time': entry.updated_time.isoformat() if entry.updated_time else None
+            }
+            for entry in entries
+        ]
     })
@@ -1,92 +1,152 @@
 from flask import Blueprint, request, jsonify
+from werkzeug.exceptions import HTTPException
 from app import app
-from app.models import db, Document, RequirementTree, ValidationResult
+from app.models import db, Document, RequirementTree, ValidationResult, Job, ValidationCheckpoint, UploadSession
+from app.document_text import (
+    read_paragraphs, save_text_artifact, compute_text_hash, paragraphs_to_text, INVALID_DOCUMENT_ERRORS
+)
+from app.upload_stream import file_id, parse_upload
+from app.bulk_upload import bulk_upload
 import os
-import hashlib
 
 upload_bp = Blueprint('upload', __name__)
 
 
-def compute_file_hash(filepath):
-    """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
-    with open(filepath, 'rb') as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            hash_md5.update(chunk)
-    return hash_md5.hexdigest()
-
-
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
 
+def existing_document_response(document, message):
+    return {
+        'doc_id': document.id,
+        'filename': document.filename,
+        'file_type': document.file_type,
+        'filepath': document.file_path,
+        'cached': True,
+        'message': message
+    }
+
+
 @upload_bp.route('/api/upload', methods=['POST'])
 def upload_file():
-    if 'file' not in request.files:
+    # 客户端已知文件摘要（X-File-Hash，算法与UPLOAD_HASH_ALGORITHM一致）且文档已存在时，不读取请求体直接返回
+    known_hash = request.headers.get('X-File-Hash', '').strip().lower()[:32]
+    if known_hash:
+        existing_doc = Document.query.filter_by(id=known_hash).first()
+        if existing_doc and os.path.exists(existing_doc.file_path):
+            return jsonify(existing_document_response(existing_doc, '文件已存在，返回已有文档'))
+    
+    # 上传内容边接收边写入临时文件并计算摘要，不再读回文件计算哈希
+    try:
+        form, uploads = parse_upload(request.environ)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    upload, filename = None, None
+    for name, part_filename, part in uploads:
+        if name == 'file' and upload is None:
+            upload, filename = part, part_filename
+        else:
+            part.discard()
+    if upload is None:
         return jsonify({'error': 'No file part'}), 400
-    file = request.files['file']
-    if file.filename == '':
+    if filename == '':
+        upload.discard()
         return jsonify({'error': 'No selected file'}), 400
-    if not allowed_file(file.filename):
+    if not allowed_file(filename):
+        upload.discard()
         return jsonify({'error': 'File type not allowed'}), 400
     
-    file_type = request.form.get('file_type', 'other')
+    file_type = form.get('file_type', 'other')
     
-    temp_filepath = None
+    upload.close()
+    body, status = store_upload(upload.path, filename, file_type, file_id(upload.hasher))
+    return jsonify(body), status
+
+
+def store_upload(temp_filepath, filename, file_type, doc_id):
+    """将已接收完整并计算出doc_id的临时文件保存为文档，返回 (响应数据, 状态码)
+
+    文件或文本内容与已有文档相同时删除临时文件并返回已有文档。
+    """
     try:
-        import uuid
-        temp_filename = f"temp_{uuid.uuid4()}_{file.filename}"
-        temp_filepath = os.path.join(app.config['UPLOAD_FOLDER'], temp_filename)
-        file.save(temp_filepath)
-        
-        file_hash = compute_file_hash(temp_filepath)
-        doc_id = file_hash
-        
         existing_doc = Document.query.filter_by(id=doc_id).first()
         
         if existing_doc and os.path.exists(existing_doc.file_path):
             os.remove(temp_filepath)
             
-            return jsonify({
-                'doc_id': existing_doc.id,
-                'filename': existing_doc.filename,
-                'file_type': existing_doc.file_type,
-                'filepath': existing_doc.file_path,
-                'cached': True,
-                'message': '文件已存在，返回已有文档'
-            })
+            return existing_document_response(existing_doc, '文件已存在，返回已有文档'), 200
         
         if existing_doc:
             db.session.delete(existing_doc)
             db.session.commit()
         
-        filename = f"{doc_id}_{file.filename}"
-        final_filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        # 上传时提取一次文本，后续解析直接读取提取结果
+        try:
+            paragraphs = read_paragraphs(temp_filepath)
+        except INVALID_DOCUMENT_ERRORS as e:
+            os.remove(temp_filepath)
+            return {'error': f'Invalid document: {str(e)}'}, 400
+        text_hash = compute_text_hash(paragraphs_to_text(paragraphs))
+        
+        # 文件字节不同但文本内容相同的文档视为同一文档
+        same_text_doc = Document.query.filter_by(text_hash=text_hash).first()
+        if same_text_doc and os.path.exists(same_text_doc.file_path):
+            os.remove(temp_filepath)
+            
+            return existing_document_response(same_text_doc, '文档内容与已有文档相同，返回已有文档'), 200
+        
+        final_filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{doc_id}_{filename}")
         
         os.rename(temp_filepath, final_filepath)
         
+        _, text_path = save_text_artifact(doc_id, paragraphs)
+        
         document = Document(
             id=doc_id,
-            filename=file.filename,
+            filename=filename,
             file_type=file_type,
-            file_path=final_filepath
+            file_path=final_filepath,
+            text_hash=text_hash,
+            text_path=text_path
         )
         db.session.add(document)
         db.session.commit()
         
-        return jsonify({
+        return {
             'doc_id': doc_id,
-            'filename': file.filename,
+            'filename': filename,
             'file_type': file_type,
             'filepath': final_filepath,
             'cached': False
-        })
+        }, 200
         
     except Exception as e:
+        db.session.rollback()
         if temp_filepath and os.path.exists(temp_filepath):
             os.remove(temp_filepath)
+        return {'error': str(e)}, 500
+
+@upload_bp.route('/api/upload/bulk', methods=['POST'])
+def upload_bulk():
+    """一次上传多个文件或zip压缩包，返回每个文件的处理结果"""
+    try:
+        form, uploads = parse_upload(request.environ)
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if form is None:
+        return jsonify({'error': 'No file part'}), 400
+    try:
+        body, status = bulk_upload(form, uploads)
+    except Exception as e:
+        for _, _, upload in uploads:
+            upload.discard()
         return jsonify({'error': str(e)}), 500
+    return jsonify(body), status
 
 @upload_bp.route('/api/delete/<doc_id>', methods=['DELETE'])
 def delete_document(doc_id):
@@ -109,17 +169,24 @@ def delete_document(doc_id):
         except Exception as e:
             errors.append(f"删除原始文件失败: {str(e)}")
     
+    # 删除上传时提取的文本
+    if document.text_path and os.path.exists(document.text_path):
+        try:
+            os.remove(document.text_path)
+            deleted_files.append(document.text_path)
+        except Exception as e:
+            errors.append(f"删除文本提取结果失败: {str(e)}")
+    
     # 2. 删除数据库记录
     try:
-        # 先删除相关的需求树记录
-        req_tree = RequirementTree.query.filter_by(doc_id=doc_id).first()
-        if req_tree:
-            db.session.delete(req_tree)
+        # 先删除引用该文档的需求树、验证结果和后台任务记录，任务删除后工作进程不会再领取
+        RequirementTree.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
+        ValidationResult.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
+        Job.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
         
-        # 再删除相关的验证结果记录
-        validation_result = ValidationResult.query.filter_by(doc_id=doc_id).first()
-        if validation_result:
-            db.session.delete(validation_result)
+        # 验证检查点日志和已完成的分片上传会话
+        ValidationCheckpoint.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
+        UploadSession.query.filter_by(doc_id=doc_id).delete(synchronize_session=False)
         
         # 最后删除文档本身
         db.session.delete(document)
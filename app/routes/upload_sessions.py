@@ -0,0 +1,294 @@
+from flask import Blueprint, request, jsonify
+from app import app
+from app.models import db, Document, UploadSession
+from app.routes.upload import allowed_file, existing_document_response, store_upload
+from app.upload_stream import file_id, new_file_hasher
+from datetime import datetime, timedelta
+import os
+import threading
+import uuid
+
+upload_sessions_bp = Blueprint('upload_sessions', __name__)
+
+# 本进程内各上传会话的增量摘要 {upload_id: (已计入的字节数, 摘要对象)}
+# 会话的分片可能由其他进程接收，字节数与会话记录不一致时从分片文件重新计算
+_hashers = {}
+_locks = {}
+_registry_lock = threading.Lock()
+
+def upload_lock(upload_id):
+    """同一上传会话的分片在本进程内依次写入"""
+    with _registry_lock:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+def forget_upload(upload_id):
+    with _registry_lock:
+        _hashers.pop(upload_id, None)
+        _locks.pop(upload_id, None)
+
+def hash_partial_file(path, size, algorithm):
+    """重新计算分片文件前size字节的摘要"""
+    hasher = new_file_hasher(algorithm)
+    buffer_size = app.config.get('UPLOAD_BUFFER_SIZE', 256 * 1024)
+    remaining = size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            chunk = f.read(min(buffer_size, remaining))
+            if not chunk:
+                break
+            hasher.update(chunk)
+            remaining -= len(chunk)
+    return hasher
+
+def advance_hasher(upload, offset, data):
+    """把新写入的分片计入会话的摘要，本进程的摘要不是截至offset时从文件重新计算"""
+    counted, hasher = _hashers.get(upload.id, (None, None))
+    if counted == offset:
+        hasher.update(data)
+    else:
+        hasher = hash_partial_file(upload.temp_path, offset + len(data), upload.hash_algorithm)
+    _hashers[upload.id] = (offset + len(data), hasher)
+
+def final_hasher(upload):
+    counted, hasher = _hashers.get(upload.id, (None, None))
+    if counted != upload.total_size:
+        hasher = hash_partial_file(upload.temp_path, upload.total_size, upload.hash_algorithm)
+    return hasher
+
+def remove_upload(upload):
+    """删除会话记录和分片文件"""
+    if os.path.exists(upload.temp_path):
+        os.remove(upload.temp_path)
+    forget_upload(upload.id)
+    db.session.delete(upload)
+
+def purge_expired_uploads():
+    """清理超过UPLOAD_SESSION_TTL未更新的上传会话
+
+    正在写入分片或保存文档的会话可能仍在处理，超过更长的UPLOAD_COMPLETING_TTL后才视为中断并清理。
+    """
+    now = datetime.utcnow()
+    deadline = now - timedelta(seconds=app.config.get('UPLOAD_SESSION_TTL', 24 * 3600))
+    busy_deadline = now - timedelta(seconds=app.config.get('UPLOAD_COMPLETING_TTL', 7 * 24 * 3600))
+    busy = UploadSession.status.in_(['writing', 'completing'])
+    expired = UploadSession.query.filter(db.or_(
+        db.and_(~busy, UploadSession.updated_time < deadline),
+        db.and_(busy, UploadSession.updated_time < busy_deadline)
+    )).all()
+    for upload in expired:
+        remove_upload(upload)
+    if expired:
+        db.session.commit()
+        print(f"清理过期上传会话 {len(expired)} 个")
+
+def upload_to_dict(upload):
+    return {
+        'upload_id': upload.id,
+        'filename': upload.filename,
+        'size': upload.total_size,
+        'offset': upload.received,
+        'status': upload.status,
+        'doc_id': upload.doc_id,
+        'hash_algorithm': upload.hash_algorithm,
+        'chunk_size': app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+        'upload_url': f'/api/upload/sessions/{upload.id}'
+    }
+
+def read_chunk(max_size):
+    """读取请求体中的分片，超过max_size时返回None，此时不会写入任何内容
+
+    声明了Content-Length时不读取请求体即可判断；分块传输的请求最多读取max_size + 1字节。
+    """
+    if request.content_length is not None and request.content_length > max_size:
+        return None
+    data = request.stream.read(max_size + 1)
+    return data if len(data) <= max_size else None
+
+@upload_sessions_bp.route('/api/upload/sessions', methods=['POST'])
+def create_upload_session():
+    """创建分片上传会话
+
+    请求体：{"filename": ..., "size": 文件字节数, "file_type": ..., "file_hash": 可选，整个文件的doc_id}。
+    声明的大小超过UPLOAD_MAX_FILE_SIZE时返回413；file_hash对应的文档已存在时直接返回已有文档。
+    """
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not filename:
+        return jsonify({'error': 'filename is required'}), 400
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed'}), 400
+    size = data.get('size')
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({'error': 'size must be a positive integer'}), 400
+    max_size = app.config.get('UPLOAD_MAX_FILE_SIZE')
+    if max_size and size > max_size:
+        return jsonify({'error': f'File too large: {size} > {max_size} bytes'}), 413
+    try:
+        hash_algorithm = app.config.get('UPLOAD_HASH_ALGORITHM', 'md5')
+        new_file_hasher(hash_algorithm)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 500
+
+    file_hash = (data.get('file_hash') or '').strip().lower()[:32] or None
+    if file_hash:
+        existing_doc = Document.query.filter_by(id=file_hash).first()
+        if existing_doc and os.path.exists(existing_doc.file_path):
+            return jsonify(existing_document_response(existing_doc, '文件已存在，返回已有文档'))
+
+    purge_expired_uploads()
+
+    upload_id = uuid.uuid4().hex
+    folder = app.config['UPLOAD_PARTIAL_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    # 保留扩展名，完成后按文件类型读取段落
+    temp_path = os.path.join(folder, f"{upload_id}{os.path.splitext(filename)[1].lower()}")
+    open(temp_path, 'wb').close()
+
+    upload = UploadSession(
+        id=upload_id,
+        filename=filename,
+        file_type=data.get('file_type', 'other'),
+        total_size=size,
+        received=0,
+        hash_algorithm=hash_algorithm,
+        file_hash=file_hash,
+        temp_path=temp_path,
+        status='uploading'
+    )
+    db.session.add(upload)
+    db.session.commit()
+    _hashers[upload_id] = (0, new_file_hasher(hash_algorithm))
+    return jsonify(upload_to_dict(upload)), 201
+
+@upload_sessions_bp.route('/api/upload/sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """查询上传会话，断线后按offset继续上传"""
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify(upload_to_dict(upload))
+
+@upload_sessions_bp.route('/api/upload/sessions/<upload_id>', methods=['PUT'])
+def append_upload_chunk(upload_id):
+    """在offset处追加一个分片，请求体为分片的原始字节
+
+    offset必须等于已接收的字节数；重发已接收过的分片直接返回当前进度，其余不连续的offset及正在写入其他分片时返回409。
+    X-Chunk-Hash为分片按会话摘要算法计算的十六进制摘要，提供时先校验再写入。
+    """
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload session not found'}), 404
+    if upload.status == 'writing':
+        return jsonify({**upload_to_dict(upload), 'error': 'Another chunk is being written'}), 409
+    if upload.status != 'uploading':
+        return jsonify({**upload_to_dict(upload), 'error': 'Upload already completed'}), 409
+    try:
+        offset = int(request.args.get('offset', ''))
+    except ValueError:
+        return jsonify({'error': 'offset must be an integer'}), 400
+
+    if offset < upload.received and request.content_length is not None \
+            and offset + request.content_length <= upload.received:
+        return jsonify(upload_to_dict(upload))
+    if offset != upload.received:
+        return jsonify({**upload_to_dict(upload), 'error': f'Expected offset {upload.received}'}), 409
+
+    # 分片不能超过UPLOAD_CHUNK_SIZE，也不能超出声明的文件大小
+    max_chunk = min(app.config.get('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024), upload.total_size - offset)
+    data = read_chunk(max_chunk)
+    if data is None:
+        return jsonify({'error': f'Chunk exceeds {max_chunk} bytes at offset {offset}'}), 413
+    if not data:
+        return jsonify({'error': 'Empty chunk'}), 400
+    chunk_hash = request.headers.get('X-Chunk-Hash', '').strip().lower()
+    if chunk_hash:
+        hasher = new_file_hasher(upload.hash_algorithm)
+        hasher.update(data)
+        if hasher.hexdigest() != chunk_hash:
+            return jsonify({**upload_to_dict(upload), 'error': 'Chunk hash mismatch'}), 400
+
+    with upload_lock(upload_id):
+        # 先用带offset条件的UPDATE占用该偏移再写文件，多个进程同时收到重发的分片时只有一个写入
+        claimed = UploadSession.query.filter_by(id=upload_id, received=offset, status='uploading').update({
+            'status': 'writing',
+            'updated_time': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if not claimed:
+            db.session.refresh(upload)
+            return jsonify({**upload_to_dict(upload), 'error': f'Expected offset {upload.received}'}), 409
+
+        try:
+            with open(upload.temp_path, 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+        except OSError as e:
+            UploadSession.query.filter_by(id=upload_id, status='writing').update(
+                {'status': 'uploading'}, synchronize_session=False
+            )
+            db.session.commit()
+            return jsonify({'error': f'Failed to write chunk: {str(e)}'}), 500
+
+        UploadSession.query.filter_by(id=upload_id, status='writing').update({
+            'received': offset + len(data),
+            'status': 'uploading',
+            'updated_time': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        advance_hasher(upload, offset, data)
+
+    db.session.refresh(upload)
+    return jsonify(upload_to_dict(upload))
+
+@upload_sessions_bp.route('/api/upload/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    """全部分片接收后保存为文档，返回与 /api/upload 相同的响应；重复调用返回已保存的文档"""
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload session not found'}), 404
+    if upload.status == 'completed':
+        document = db.session.get(Document, upload.doc_id)
+        if document:
+            return jsonify({**existing_document_response(document, '上传已完成'), 'upload_id': upload_id})
+        return jsonify({'error': 'Document not found'}), 404
+    if upload.received != upload.total_size:
+        return jsonify({**upload_to_dict(upload), 'error': 'Upload incomplete'}), 409
+
+    # 先将会话标记为保存中，同时到达的重复请求不会重复保存；正在写入分片的会话不能完成
+    claimed = UploadSession.query.filter_by(id=upload_id, received=upload.total_size, status='uploading').update(
+        {'status': 'completing', 'updated_time': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    if not claimed:
+        return jsonify({'error': 'Upload is being completed'}), 409
+
+    with upload_lock(upload_id):
+        doc_id = file_id(final_hasher(upload))
+    if upload.file_hash and upload.file_hash != doc_id:
+        remove_upload(upload)
+        db.session.commit()
+        return jsonify({'error': f'File hash mismatch: expected {upload.file_hash}, got {doc_id}'}), 400
+
+    body, status = store_upload(upload.temp_path, upload.filename, upload.file_type, doc_id)
+    upload = db.session.get(UploadSession, upload_id)
+    if status != 200:
+        remove_upload(upload)
+        db.session.commit()
+        return jsonify(body), status
+
+    upload.status = 'completed'
+    upload.doc_id = body['doc_id']
+    upload.updated_time = datetime.utcnow()
+    db.session.commit()
+    forget_upload(upload_id)
+    return jsonify({**body, 'upload_id': upload_id})
+
+@upload_sessions_bp.route('/api/upload/sessions/<upload_id>', methods=['DELETE'])
+def abort_upload_session(upload_id):
+    """放弃上传，删除已接收的分片"""
+    upload = db.session.get(UploadSession, upload_id)
+    if not upload:
+        return jsonify({'error': 'Upload session not found'}), 404
+    remove_upload(upload)
+    db.session.commit()
+    return jsonify({'success': True, 'upload_id': upload_id})
@@ -0,0 +1,104 @@
+from flask import Blueprint, request, jsonify
+from app.models import LLMCall
+from datetime import datetime, timedelta
+import math
+
+usage_bp = Blueprint('usage', __name__)
+
+# 时间窗口粒度 -> 将时间截断到窗口起点的函数
+BUCKETS = {
+    'minute': lambda t: t.replace(second=0, microsecond=0),
+    'hour': lambda t: t.replace(minute=0, second=0, microsecond=0),
+    'day': lambda t: t.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+
+def aggregate_calls(calls):
+    """汇总一组大模型调用的次数、token用量、缓存命中率和耗时"""
+    latencies = sorted(call.latency_ms for call in calls if call.latency_ms is not None)
+    prompt_tokens = sum(call.prompt_tokens or 0 for call in calls)
+    cache_hit_tokens = sum(call.cache_hit_tokens or 0 for call in calls)
+    succeeded = sum(1 for call in calls if call.outcome == 'success')
+    return {
+        'calls': len(calls),
+        'succeeded': succeeded,
+        'failed': len(calls) - succeeded,
+        'retries': sum(call.retries or 0 for call in calls),
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': sum(call.completion_tokens or 0 for call in calls),
+        'cache_hit_tokens': cache_hit_tokens,
+        'cache_hit_rate': round(cache_hit_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+        'avg_latency_ms': round(sum(latencies) / len(latencies), 1) if latencies else None,
+        'p95_latency_ms': round(latencies[math.ceil(len(latencies) * 0.95) - 1], 1) if latencies else None,
+        'max_latency_ms': round(latencies[-1], 1) if latencies else None
+    }
+
+def aggregate_by(calls, key):
+    """按key分组汇总"""
+    groups = {}
+    for call in calls:
+        groups.setdefault(key(call), []).append(call)
+    return {group: aggregate_calls(items) for group, items in groups.items()}
+
+def call_to_dict(call):
+    return {
+        'id': call.id,
+        'stage': call.stage,
+        'doc_id': call.doc_id,
+        'batch_index': call.batch_index,
+        'model': call.model,
+        'prompt_tokens': call.prompt_tokens,
+        'completion_tokens': call.completion_tokens,
+        'cache_hit_tokens': call.cache_hit_tokens,
+        'latency_ms': call.latency_ms,
+        'retries': call.retries,
+        'outcome': call.outcome,
+        'error': call.error,
+        'created_time': call.created_time.isoformat() if call.created_time else None
+    }
+
+@usage_bp.route('/api/usage/documents/<doc_id>', methods=['GET'])
+def document_usage(doc_id):
+    """汇总单个文档的大模型用量，按阶段分组；calls=true时附带每次调用的明细"""
+    calls = LLMCall.query.filter_by(doc_id=doc_id).order_by(LLMCall.created_time).all()
+    body = {
+        'doc_id': doc_id,
+        'totals': aggregate_calls(calls),
+        'stages': aggregate_by(calls, lambda call: call.stage or 'other')
+    }
+    if request.args.get('calls', 'false').lower() == 'true':
+        body['calls'] = [call_to_dict(call) for call in calls]
+    return jsonify(body)
+
+@usage_bp.route('/api/usage', methods=['GET'])
+def usage_windows():
+    """按时间窗口汇总大模型用量
+
+    参数：since/until为ISO时间（UTC，默认最近24小时），bucket为minute/hour/day，stage可选。
+    """
+    bucket = request.args.get('bucket', 'hour')
+    if bucket not in BUCKETS:
+        return jsonify({'error': f"bucket must be one of {', '.join(BUCKETS)}"}), 400
+    try:
+        until = datetime.fromisoformat(request.args['until']) if request.args.get('until') else datetime.utcnow()
+        since = datetime.fromisoformat(request.args['since']) if request.args.get('since') else until - timedelta(days=1)
+    except ValueError:
+        return jsonify({'error': 'since and until must be ISO 8601 timestamps'}), 400
+
+    query = LLMCall.query.filter(LLMCall.created_time >= since, LLMCall.created_time < until)
+    if request.args.get('stage'):
+        query = query.filter_by(stage=request.args['stage'])
+    calls = query.order_by(LLMCall.created_time).all()
+
+    truncate = BUCKETS[bucket]
+    windows = aggregate_by(calls, lambda call: truncate(call.created_time))
+    return jsonify({
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'bucket': bucket,
+        'totals': aggregate_calls(calls),
+        'stages': aggregate_by(calls, lambda call: call.stage or 'other'),
+        'windows': [
+            {'start': start.isoformat(), **stats}
+            for start, stats in sorted(windows.items())
+        ]
+    })
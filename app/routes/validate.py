@@ -1,284 +1,552 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from app import app
-from app.models import db, ValidationResult
-import os
-import requests
+from app.models import db
+from app.llm_client import LLMError, chat_completion, estimate_tokens
+from app.rule_registry import NO_RULE, RULE_RESOLUTION_VERSION, get_rule_set
+from app.rule_index import weighted_text
+from app.cache_store import cache_get, cache_put, cache_get_many, cache_put_many
+from app.checkpoint_store import append_checkpoint, load_checkpoint, clear_checkpoint
+from app.routes.parse import ndjson_line
+from app.result_store import (
+    put_result, get_result, is_result_hash, apply_overlay,
+    load_requirement_tree, load_validation_result, load_validation_match_options, save_validation_ref
+)
 import json
 import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 validate_bp = Blueprint('validate', __name__)
 
-VALIDATE_OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'validate_results')
-CACHE_INDEX_FILE = os.path.join(VALIDATE_OUTPUT_FOLDER, 'cache_index.json')
+# 需求树内容哈希 -> 结果存储中的验证结果哈希
+# 旧版validate_results/cache_index.json记录的是doc_id，且内容哈希的计算方式已改变，不再导入
+VALIDATE_CACHE_NAMESPACE = 'validate_content'
+# 节点验证缓存键 -> 该节点的验证结论 {result, reason}
+VALIDATE_NODE_CACHE_NAMESPACE = 'validate_node'
+# 修改验证提示词或结果格式时递增，使节点验证缓存失效
+VALIDATE_PROMPT_VERSION = 2
 
-if not os.path.exists(VALIDATE_OUTPUT_FOLDER):
-    os.makedirs(VALIDATE_OUTPUT_FOLDER)
-
-def load_cache_index():
-    """加载验证缓存索引"""
-    if os.path.exists(CACHE_INDEX_FILE):
-        with open(CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
-
-def save_cache_index(cache_index):
-    """保存验证缓存索引"""
-    with open(CACHE_INDEX_FILE, 'w', encoding='utf-8') as f:
-        json.dump(cache_index, f, ensure_ascii=False, indent=2)
-
-def compute_content_hash(req_tree):
-    """计算需求树内容的哈希值"""
-    content_str = json.dumps(req_tree, sort_keys=True, ensure_ascii=False)
+def compute_content_hash(req_tree, match_options=None):
+    """计算需求树内容的哈希值，根节点名称只影响结果中的根节点，不参与计算
+    
+    启用规则相似度匹配时，匹配阈值不同会得到不同的验证结果，阈值一并参与计算；规则查找方式的版本也参与计算。
+    """
+    content = {**req_tree, 'label': None, 'rule_resolution': RULE_RESOLUTION_VERSION}
+    if match_options:
+        content['rule_match'] = match_options
+    content_str = json.dumps(content, sort_keys=True, ensure_ascii=False)
     hash_md5 = hashlib.md5()
     hash_md5.update(content_str.encode('utf-8'))
     return hash_md5.hexdigest()
 
+def default_rule_match_options():
+    """配置中的规则相似度匹配阈值，未启用相似度匹配时返回None"""
+    if not app.config.get('VALIDATE_RULE_MATCH', True):
+        return None
+    return {
+        'min_score': app.config.get('VALIDATE_RULE_MATCH_MIN_SCORE', 0.3),
+        'min_margin': app.config.get('VALIDATE_RULE_MATCH_MIN_MARGIN', 0.02)
+    }
+
+def read_rule_match_options(args):
+    """读取请求参数match_min_score和match_min_margin，未指定时返回None，取值不在0到1之间时抛出ValueError"""
+    if 'match_min_score' not in args and 'match_min_margin' not in args:
+        return None
+    options = {
+        'min_score': app.config.get('VALIDATE_RULE_MATCH_MIN_SCORE', 0.3),
+        'min_margin': app.config.get('VALIDATE_RULE_MATCH_MIN_MARGIN', 0.02)
+    }
+    for name in ('min_score', 'min_margin'):
+        if f'match_{name}' in args:
+            value = float(args[f'match_{name}'])
+            if not 0 <= value <= 1:
+                raise ValueError(f'match_{name} must be between 0 and 1')
+            options[name] = value
+    return options
+
 @validate_bp.route('/api/validate/<doc_id>', methods=['GET'])
 def validate_requirements(doc_id):
     if not doc_id:
         return jsonify({'error': 'doc_id is required'}), 400
     
-    # 1. 检查是否已有验证结果文件
-    validation_file = os.path.join(VALIDATE_OUTPUT_FOLDER, f"validation_{doc_id}.json")
-    if os.path.exists(validation_file):
-        with open(validation_file, 'r', encoding='utf-8') as f:
-            validation_results = json.load(f)
-        return jsonify({
-            'validation_results': validation_results,
-            'cached': True
-        })
-    
-    # 2. 从parse结果读取需求树
-    base_dir = os.path.dirname(os.path.dirname(__file__))
-    json_file = os.path.join(base_dir, 'parse_results', f"{doc_id}.json")
-    
-    if os.path.exists(json_file):
-        with open(json_file, 'r', encoding='utf-8') as f:
-            req_tree = json.load(f)
-    else:
-        # 从数据库读取
-        from app.models import RequirementTree
-        requirement_tree = RequirementTree.query.filter_by(doc_id=doc_id).first()
-        if not requirement_tree:
-            return jsonify({'error': 'Requirement tree not found'}), 404
-        req_tree = requirement_tree.tree_json
+    try:
+        match_options = read_rule_match_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    body, status = run_validation(doc_id, match_options=match_options)
+    return jsonify(body), status
+
+def is_unverified(result):
+    """判断节点结论是否因大模型不可用而未经验证
+
+    兼容未标记verified的旧结果：旧版在大模型不可用时不记录source，理由为"……默认标记为合规。"。
+    """
+    if result.get('verified') is False or result.get('source') == 'default':
+        return True
+    return 'source' not in result and '默认标记为合规' in (result.get('reason') or '')
+
+def summarize_sources(validation_results):
+    """统计各节点结论的来源，fallback_rate为因大模型不可用而使用默认结果的节点占比，rule_matched为按相似度匹配规则的节点数"""
+    counts = {'llm': 0, 'cache': 0, 'local': 0, 'default': 0}
+    unverified = rule_matched = 0
+    for result in validation_results:
+        if result.get('id') == 'root':
+            continue
+        source = result.get('source') or ('default' if is_unverified(result) else 'llm')
+        counts[source] = counts.get(source, 0) + 1
+        unverified += is_unverified(result)
+        rule_matched += 'rule_match' in result
+    total = sum(counts.values())
+    return {
+        'total': total,
+        **counts,
+        'unverified': unverified,
+        'rule_matched': rule_matched,
+        'fallback_rate': round(counts['default'] / total, 4) if total else 0.0
+    }
+
+def load_existing_validation(doc_id):
+    """读取文档已有的验证结果，不存在时返回None"""
+    validation_results = load_validation_result(doc_id)
+    if validation_results is None:
+        return None
+    return {
+        'validation_results': validation_results,
+        'cached': True,
+        'stats': summarize_sources(validation_results)
+    }
+
+def load_cached_validation(doc_id, req_tree, content_hash, match_options=None):
+    """相同内容的需求树已验证过时，只为当前doc_id记录引用并返回响应数据，否则返回None"""
+    result_hash = cache_get(VALIDATE_CACHE_NAMESPACE, content_hash)
+    cached_results = get_result(result_hash) if is_result_hash(result_hash) else None
+    if cached_results is None:
+        return None
+    
+    print(f"发现相同需求树，引用已缓存的验证结果: {result_hash}")
+    root_name = req_tree.get('label', 'root')
+    save_validation_ref(doc_id, result_hash, root_name, app.config['API_MODEL_DEFAULT'], match_options)
+    db.session.commit()
+    
+    return {
+        'validation_results': apply_overlay(cached_results, {'name': root_name}),
+        'cached': True,
+        'result_hash': result_hash,
+        'stats': summarize_sources(cached_results)
+    }
+
+def save_validation(doc_id, req_tree, content_hash, validation_results, match_options=None):
+    """保存验证结果并更新缓存索引，记录所用的规则相似度匹配阈值，返回响应数据"""
+    result_hash = put_result(validation_results)
+    cache_put(VALIDATE_CACHE_NAMESPACE, content_hash, result_hash)
+    
+    save_validation_ref(doc_id, result_hash, req_tree.get('label', 'root'), app.config['API_MODEL_DEFAULT'],
+                        match_options)
+    db.session.commit()
+    clear_checkpoint(doc_id)
+    
+    stats = summarize_sources(validation_results)
+    print(f"验证完成: {stats}")
+    
+    return {
+        'validation_results': validation_results,
+        'cached': False,
+        'result_hash': result_hash,
+        'stats': stats
+    }
+
+def run_validation(doc_id, progress=None, match_options=None):
+    """验证需求树并保存结果，返回 (响应数据, 状态码)
+    
+    progress为可选的进度回调，每完成一批调用 progress(已完成批数, 总批数)。
+    match_options为请求指定的规则相似度匹配阈值，指定时不复用文档已有的验证结果，按新阈值重新验证。
+    """
+    # 1. 检查是否已有验证结果
+    if match_options is None:
+        existing = load_existing_validation(doc_id)
+        if existing:
+            return existing, 200
+    
+    # 2. 读取需求树
+    req_tree = load_requirement_tree(doc_id)
+    if req_tree is None:
+        return {'error': 'Requirement tree not found'}, 404
     
     # 3. 检查验证缓存
-    content_hash = compute_content_hash(req_tree)
-    cache_index = load_cache_index()
-    
-    if content_hash in cache_index:
-        cached_doc_id = cache_index[content_hash]
-        cached_validation_file = os.path.join(VALIDATE_OUTPUT_FOLDER, f"validation_{cached_doc_id}.json")
-        if os.path.exists(cached_validation_file):
-            print(f"发现相同需求树，已缓存验证结果 doc_id: {cached_doc_id}")
-            
-            with open(cached_validation_file, 'r', encoding='utf-8') as f:
-                validation_results = json.load(f)
-            
-            # 保存当前doc_id的验证结果
-            with open(validation_file, 'w', encoding='utf-8') as f:
-                json.dump(validation_results, f, ensure_ascii=False, indent=2)
-            
-            # 保存到数据库
-            existing_result = ValidationResult.query.filter_by(doc_id=doc_id).first()
-            if existing_result:
-                # 更新现有记录
-                existing_result.result_json = validation_results
-                existing_result.model_used = app.config['API_MODEL_DEFAULT']
-            else:
-                # 创建新记录
-                result = ValidationResult(
-                    doc_id=doc_id,
-                    result_json=validation_results,
-                    model_used=app.config['API_MODEL_DEFAULT']
-                )
-                db.session.add(result)
-            db.session.commit()
-            
-            return jsonify({
-                'validation_results': validation_results,
-                'cached': True,
-                'cached_from': cached_doc_id
-            })
+    match_options = match_options or default_rule_match_options()
+    content_hash = compute_content_hash(req_tree, match_options)
+    cached = load_cached_validation(doc_id, req_tree, content_hash, match_options)
+    if cached:
+        return cached, 200
     
     # 4. 执行验证
     rules = load_rules('appendix_j')
-    validation_results = validate_batch(req_tree, rules)
+    validation_results = validate_batch(req_tree, rules, progress, doc_id, match_options, content_hash)
     
-    # 5. 保存验证结果
-    with open(validation_file, 'w', encoding='utf-8') as f:
-        json.dump(validation_results, f, ensure_ascii=False, indent=2)
+    # 5. 保存验证结果并更新缓存索引
+    return save_validation(doc_id, req_tree, content_hash, validation_results, match_options), 200
+
+def resume_validation(doc_id, match_options=None):
+    """只对上次未经验证的节点重新调用大模型，结论合并到原验证结果中，返回 (响应数据, 状态码)"""
+    validation_results = load_validation_result(doc_id)
+    if validation_results is None:
+        return {'error': 'Validation result not found'}, 404
     
-    # 更新缓存索引
-    cache_index[content_hash] = doc_id
-    save_cache_index(cache_index)
+    req_tree = load_requirement_tree(doc_id)
+    if req_tree is None:
+        return {'error': 'Requirement tree not found'}, 404
     
-    # 保存到数据库
-    result = ValidationResult(
-        doc_id=doc_id,
-        result_json=validation_results,
-        model_used=app.config['API_MODEL_DEFAULT']
-    )
-    db.session.add(result)
-    db.session.commit()
+    unverified_ids = {result['id'] for result in validation_results if is_unverified(result)}
+    if not unverified_ids:
+        return {
+            'validation_results': validation_results,
+            'cached': True,
+            'resumed': 0,
+            'stats': summarize_sources(validation_results)
+        }, 200
     
-    return jsonify({
-        'validation_results': validation_results,
-        'cached': False
-    })
+    print(f"继续验证 {len(unverified_ids)} 个未经验证的节点")
+    nodes = validation_nodes(req_tree)
+    parent_ids = {node['parent_id'] for node in nodes}
+    pending = [node for node in nodes if node['id'] in unverified_ids]
+    
+    rules = load_rules('appendix_j')
+    if match_options is None:
+        # 沿用上次验证的匹配阈值，结果与检查点对应同一内容哈希；旧记录没有保存阈值时按当前配置
+        match_options = load_validation_match_options(doc_id)
+        if match_options is None:
+            match_options = default_rule_match_options()
+    content_hash = compute_content_hash(req_tree, match_options)
+    results_by_id = {}
+    for _, _, results in iter_validate_batches(pending, rules, doc_id, parent_ids, match_options, content_hash):
+        for result in results:
+            results_by_id[result['id']] = result
+    
+    merged = [results_by_id.get(result['id'], result) for result in validation_results]
+    # 相同内容的需求树引用合并后的结果，下次命中验证缓存时不再返回未经验证的结论
+    body = save_validation(doc_id, req_tree, content_hash, merged, match_options)
+    body['resumed'] = sum(1 for result in results_by_id.values() if not is_unverified(result))
+    return body, 200
+
+@validate_bp.route('/api/validate/<doc_id>/resume', methods=['POST'])
+def resume_validate_requirements(doc_id):
+    """重新验证上次因大模型不可用而使用默认结果的节点"""
+    try:
+        match_options = read_rule_match_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    body, status = resume_validation(doc_id, match_options)
+    return jsonify(body), status
+
+@validate_bp.route('/api/validate/<doc_id>/stream', methods=['GET'])
+def validate_requirements_stream(doc_id):
+    """流式验证需求树，以NDJSON逐批推送各节点的结论和进度，最后推送完整结果"""
+    try:
+        match_options = read_rule_match_options(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    existing = load_existing_validation(doc_id) if match_options is None else None
+    if existing:
+        return Response(ndjson_line({'type': 'done', **existing}), mimetype='application/x-ndjson')
+    match_options = match_options or default_rule_match_options()
+    
+    req_tree = load_requirement_tree(doc_id)
+    if req_tree is None:
+        return jsonify({'error': 'Requirement tree not found'}), 404
+    
+    def generate():
+        content_hash = compute_content_hash(req_tree, match_options)
+        cached = load_cached_validation(doc_id, req_tree, content_hash, match_options)
+        if cached:
+            yield ndjson_line({'type': 'done', **cached})
+            return
+        
+        rules = load_rules('appendix_j')
+        nodes = validation_nodes(req_tree)
+        results_by_id = {}
+        try:
+            for done, total_batches, results in iter_validate_batches(
+                nodes, rules, doc_id, match_options=match_options, checkpoint=content_hash
+            ):
+                if done == 0:
+                    # 第一条事件附带根节点以及本地检查和缓存命中的结论
+                    results = [root_validation_result(req_tree)] + results
+                for result in results:
+                    results_by_id[result['id']] = result
+                yield ndjson_line({
+                    'type': 'results',
+                    'results': results,
+                    'done_batches': done,
+                    'total_batches': total_batches,
+                    'done_nodes': len(results_by_id) - 1,
+                    'total_nodes': len(nodes)
+                })
+        except Exception as e:
+            print(f"流式验证失败: {str(e)}")
+            yield ndjson_line({'type': 'error', 'error': '验证失败，请检查API配置或网络连接'})
+            return
+        
+        validation_results = [results_by_id['root']] + [results_by_id[node['id']] for node in nodes]
+        yield ndjson_line({'type': 'done', **save_validation(doc_id, req_tree, content_hash, validation_results, match_options)})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
 def load_rules(appendix):
-    """加载附录规则，构建规则树"""
-    if appendix == 'appendix_j':
-        appendix_file = os.path.join(app.config['APPENDICES_FOLDER'], '438C-2021附录J.txt')
-        if os.path.exists(appendix_file):
-            return build_rule_tree_from_file(appendix_file)
-        else:
-            return get_default_appendix_j_rules()
-    return {}
-
-def build_rule_tree_from_file(file_path):
-    """从文件构建规则树"""
+    """获取附录的编译规则集，附录文件未修改时直接复用"""
+    return get_rule_set(appendix)
+
+VALIDATE_SYSTEM_PROMPT = '你是一个专业的需求文档审查专家，精通软件工程和需求分析。'
+# 估算每个节点输出的token数：节点ID、父节点ID、result和约60字的reason，另加节点名称
+OUTPUT_TOKENS_PER_NODE = 100
+OUTPUT_TOKENS_OVERHEAD = 20
+
+def estimate_node_tokens(node, rules):
+    """估算一个节点在提示词中（不含规范正文）和在模型输出中占用的token数，以及其规范正文的token数"""
+    title_number, rule = resolve_rule(node, rules)
+    prompt_tokens = estimate_tokens(format_prompt_node(1, node, title_number, 'R1'))
+    rule_tokens = estimate_tokens(format_prompt_rule('R1', rule))
+    output_tokens = OUTPUT_TOKENS_PER_NODE + estimate_tokens(node['name'])
+    return prompt_tokens, rule_tokens, output_tokens
+
+def group_nodes_by_rule(nodes, rules):
+    """将适用同一条规范的节点排在一起，便于装入同一批共享规范正文，组内保持原顺序"""
+    groups = {}
+    for node in nodes:
+        groups.setdefault(resolve_rule(node, rules)[1], []).append(node)
+    return [node for group in groups.values() for node in group]
+
+def pack_batches(nodes, rules):
+    """按估算的提示词和输出token数依次装箱，任一预算将超出时开始新的一批
+    
+    节点先按适用的规范分组，每条规范的正文在一批中只计一次。节点内容短时一批可以容纳更多节点，
+    内容或规则很长时批次变小，避免模型输出被max_tokens截断。单个节点超出预算时单独成批。
+    """
+    max_prompt_tokens = app.config.get('VALIDATE_MAX_PROMPT_TOKENS', 6000) \
+        - estimate_tokens(construct_validation_prompt([], rules))
+    max_output_tokens = app.config.get('VALIDATE_MAX_OUTPUT_TOKENS', 2000) - OUTPUT_TOKENS_OVERHEAD
+    max_nodes = app.config.get('VALIDATE_MAX_BATCH_NODES', 30)
+    
+    batches = []
+    current, current_rules, prompt_used, output_used = [], set(), 0, 0
+    for node in group_nodes_by_rule(nodes, rules):
+        prompt_tokens, rule_tokens, output_tokens = estimate_node_tokens(node, rules)
+        rule = resolve_rule(node, rules)[1]
+        needed = prompt_tokens + (0 if rule in current_rules else rule_tokens)
+        if current and (prompt_used + needed > max_prompt_tokens
+                        or output_used + output_tokens > max_output_tokens
+                        or len(current) >= max_nodes):
+            batches.append(current)
+            current, current_rules, prompt_used, output_used = [], set(), 0, 0
+            needed = prompt_tokens + rule_tokens
+        current.append(node)
+        current_rules.add(rule)
+        prompt_used += needed
+        output_used += output_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def validate_one_batch(batch_idx, total_batches, batch_nodes, rules, doc_id=None):
+    """验证一批节点，大模型调用或响应解析失败时该批使用默认结果，不影响其他批"""
+    print(f"验证第 {batch_idx + 1}/{total_batches} 批 ({len(batch_nodes)} 个节点)...")
+    
+    prompt = construct_validation_prompt(batch_nodes, rules)
+    
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        model_response = chat_completion(
+            prompt, VALIDATE_SYSTEM_PROMPT, app.config.get('VALIDATE_MAX_OUTPUT_TOKENS', 2000),
+            context={'stage': 'validate', 'doc_id': doc_id, 'batch_index': batch_idx}
+        )
+        
+        print(f"API响应: {model_response[:200]}...")
         
-        rules = {}
-        lines = content.strip().split('\n')
+        cleaned_response = model_response.strip()
         
-        current_section = ''
-        current_content = []
+        if cleaned_response.startswith('[') and not cleaned_response.endswith(']'):
+            last_brace = cleaned_response.rfind('}')
+            if last_brace != -1:
+                cleaned_response = cleaned_response[:last_brace+1] + ']'
         
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-            
-            import re
-            section_match = re.match(r'^(\d+(\.\d+)*)\s*(.+)$', line)
-            if section_match:
-                if current_section:
-                    rules[current_section] = ' '.join(current_content)
-                
-                current_section = section_match.group(1)
-                current_content = [section_match.group(3)]
+        try:
+            batch_results = json.loads(cleaned_response)
+            if not isinstance(batch_results, list):
+                batch_results = [batch_results]
+        except json.JSONDecodeError:
+            json_match = re.search(r'\[\s*\{[\s\S]*?\}\s*\]', cleaned_response)
+            if json_match:
+                batch_results = json.loads(json_match.group(0))
             else:
-                current_content.append(line)
+                return generate_default_results(batch_nodes)
         
-        if current_section:
-            rules[current_section] = ' '.join(current_content)
+        print(f"  第 {batch_idx + 1} 批验证完成，获得 {len(batch_results)} 个结果")
+        return match_batch_results(batch_nodes, batch_results)
         
-        return rules
+    except LLMError as e:
+        print(f"第 {batch_idx + 1} 批大模型调用失败: {type(e).__name__}: {str(e)}")
+        return generate_default_results(batch_nodes)
     except Exception as e:
-        print(f"加载附录文件失败: {str(e)}")
-        return get_default_appendix_j_rules()
+        print(f"第 {batch_idx + 1} 批验证失败: {str(e)}")
+        return generate_default_results(batch_nodes)
 
-def get_default_appendix_j_rules():
-    """获取默认的附录J规则"""
-    return {
-        '1': '范围：本章应描述本文档所适用系统和软件的完整标识，适用时，包括其标识号、名称、缩略名、版本号和发布号；概述本文档适用的系统和软件的用途；描述系统和软件的一般特性；概述系统开发、运行和维护的历史；标识项目的需方、用户、开发方和保障机构等；标识当前和计划的运行现场；列出其他有关文档；概述本文档的用途和内容，并描述与它的使用有关的安全保密方面的要求。',
-        '1.1': '标识：本条应描述本文档所适用系统和软件的完整标识，适用时，包括其标识号、名称、缩略名、版本号和发布号。',
-        '1.2': '系统概述：本条应概述本文档适用的系统和软件的用途；描述系统和软件的一般特性（如规模、安全性、可靠性、实时性、技术风险等特性）；概述系统开发、运行和维护的历史；标识项目的需方、用户、开发方和保障机构等；标识当前和计划的运行现场；列出其他有关文档。',
-        '1.3': '文档概述：本条应概述本文档的用途和内容，并描述与它的使用有关的安全保密方面的要求。',
-        '2': '引用文档：本章应列出引用文档的编号、标题、编写单位、修订版及日期，还应给出不能通过正常渠道得到的文档的来源。',
-        '3': '需求：本章应分为如下小条规定CSCI需求，即作为CSCI验收条件的CSCI特征。CSCI需求是为满足分配给该CSCI的系统需求而形成的软件需求。每条需求应指定项目唯一的标识符以便测试和追踪，而且应以一种能为其定义具体测试对象的方式来描述。每条需求应注明所采用的合格性方法（见第4章），还应注明与系统或子系统需求的可追踪性（或在第5章给出）。',
-        '3.1': '要求的状态和方式：如果要求CSCI在多种状态或方式下运行，并且不同的状态或方式具有不同的需求，则应标识和定义每一状态和方式。状态和方式的例子包括：空闲、就绪、活动、事后分析、训练、降级、紧急情况、后备、战时和平时等。可以仅用状态描述CSCI，也可以仅用方式、用方式中的状态、状态中的方式、或其他有效的方案描述CSCI。如果不需要多种状态和方式，应如实陈述，而不需要进行人为的区分；如果需要多种状态和/或方式，应使本规格说明中的每个需求或每组需求与这些状态和方式相对应，对应关系可以在本条或本条所引用的附录中，通过表格或其他方式加以指明，也可以在该需求出现的章条中加以说明。',
-        '3.2': 'CSCI能力需求：本条应逐一列出与CSCI各个能力相关的需求，可分为若干子条。"CSCI能力需求"中的"能力"为一组相关需求，可用"功能"、"主题"、"目标"、或其他适合表示需求的词替代。',
-        '3.3': 'CSCI外部接口需求：本条可分为若干个小条来规定关于CSCI的外部接口的需求（若有）。本条可引用一个或多个接口需求规格说明（IRS）或包含这些需求的其他文档。',
-        '3.4': 'CSCI内部接口需求：本条应指明施加于CSCI内部接口的需求（若有）。如果所有内部接口都留待设计时再明确，那么应在此如实陈述。如果施加了这样的需求，应按3.3要求描述。',
-        '3.5': 'CSCI内部数据需求：本条应指明施加于CSCI内部数据的需求（若有），包括对CSCI中数据库和数据文件的需求（若有）。如果关于内部数据的所有决策都留待设计时再考虑，那么应在此如实陈述。如果施加了这样的需求，应按3.3.Xc）和3.3.Xd）要求描述。',
-        '3.6': '适应性需求：（若有）本条应指明与CSCI安装相关的数据需求（如场地的经纬度或位置编码），应描述CSCI使用要求的运行参数（如与使用相关的目标设置或数据记录等方面参数），这些运行参数可能会根据运行需要而改变。',
-        '3.7': '保密性（Security）需求：（若有）本条应指明与维护保密性有关的CSCI需求。（若适用）这些需求应包括：CSCI必须在其中运行的保密性环境、所提供的保密性的类型和级别、CSCI必须经受的保密性风险、减少此类风险所需的安全措施、必须遵循的保密性政策、CSCI必须具备的保密性责任、保密性认证认可必须满足的准则等。',
-        '3.8': '安全性（Safety）需求：（若有）本条应指明关于防止或尽可能降低对人员、财产和物理环境产生意外危险的CSCI安全性需求。例子包括：CSCI必须提供的安全措施，以便防止意外动作（例如意外地发出一个"自动导航关闭"命令）和无动作（例如发出"自动导航关闭"命令失败）。本条还应包括关于系统核部件的CSCI需求（若有），若适用应包括预防意外爆炸以及与核安全规则保持一致等方面的需求。',
-        '3.9': 'CSCI环境适应性需求：（若有）本条应指明CSCI的运行环境需求，例如运行CSCI的计算机硬件和操作系统（对计算机资源的其他需求见3.11）。',
-        '3.10': '其他质量特性：本条应指明合同规定的或由更高一层规格说明派生出的CSCI其他质量特性方面的需求，其中包括：可靠性、测试性，维护性等。',
-        '3.11': '计算机资源需求：本条应指明CSCI必须使用的计算机硬件的需求、计算机硬件资源使用需求、计算机软件需求和计算机通信需求。',
-        '3.12': '设计和实现约束：本条应指明约束CSCI的设计和实现的需求（若有）。这些需求可引用相应的商用或军用标准和规范来指定。',
-        '3.13': '人员相关需求：（若有）本条应描述CSCI需求，包括与CSCI使用或保障人员有关的容纳人员的数量、技能等级、工作周期、必需的训练以及其他的信息，例如要求允许多少用户同时工作，以及内置的帮助和培训短片等方面的需求：也包括施加于CSCI的人机工程需求（若有）。',
-        '3.14': '训练相关需求：（若有）本条应指明与训练相关的CSCI需求，如包括在CSCI中的训练软件。',
-        '3.15': '软件保障需求：本条应指明与软件保障考虑有关的CSCI需求（若有）。这些考虑可以包括：对系统维护、软件保障、系统运输方式、补给系统的要求、对现有设施的影响和对现有设备的影响。',
-        '3.16': '包装需求：本条应指明为了交付而对CSCI进行包装、标记和处理（例如用光盘提交，并按规定要求对光盘标记和包装）的需求（若有），可引用适用的标准。',
-        '3.17': '其他需求：本条应指明上述各条未能覆盖的其他CSCI需求（若有）。',
-        '3.18': '需求的优先顺序和关键性：（若适用）本条应指明本规格说明中各需求的优先次序、关键性或表示其相对重要性的权重。例如标识出对安全性和保密性关键的需求，以便进行特殊处理。如果所有需求具有相等的权重，本条应如实说明。',
-        '4': '合格性规定：本条应定义一组合格性检验方法，针对第3章中的每个需求指定确定需求得到满足所使用的方法。可用表格形式表述，或为第3章中的每个需求注明所使用的方法。',
-        '5': '需求可追踪性：本章应描述从本规格说明中的每一个CSCI需求，到所涉及的系统/子系统需求的可追踪性；从已分配给本CSCI的每一个系统/子系统需求，到所涉及的CSCI需求的可追踪性。',
-        '6': '注释：本章应包括有助于了解文档的所有信息（例如：背景、术语、缩略语或公式）。'
+def match_batch_results(batch_nodes, batch_results):
+    """按节点ID对齐大模型返回的结果，缺少结果的节点使用默认结果"""
+    results_by_id = {
+        result.get('id'): result for result in batch_results
+        if isinstance(result, dict) and 'result' in result
     }
+    matched = []
+    for node in batch_nodes:
+        result = results_by_id.get(node['id'])
+        if result is None:
+            matched.extend(generate_default_results([node]))
+            continue
+        matched.append(node_result(node, bool(result.get('result')), result.get('reason', ''), 'llm'))
+    return matched
 
-BATCH_SIZE = 10
+def node_result(node, result, reason, source):
+    """构造单个节点的验证结论，按相似度匹配规则的节点附带匹配的规则和相似度"""
+    node_result = {
+        'id': node['id'],
+        'name': node['name'],
+        'result': result,
+        'reason': reason,
+        'parent_id': node.get('parent_id'),
+        'source': source
+    }
+    if node.get('rule_match'):
+        node_result['rule_match'] = node['rule_match']
+    return node_result
 
-def validate_batch(req_tree, rules):
-    """批处理验证需求树"""
+def validation_nodes(req_tree):
+    """收集需要验证的节点（不含根节点），按文档顺序排列"""
     nodes = []
     collect_nodes(req_tree, nodes)
     
     print(f"收集到 {len(nodes)} 个节点进行验证")
     
-    if not nodes:
-        return []
-    
     if nodes and nodes[0].get('id') == 'root':
         nodes = nodes[1:]
-    
-    all_results = []
-    total_batches = (len(nodes) + BATCH_SIZE - 1) // BATCH_SIZE
-    
-    for batch_idx in range(total_batches):
-        start_idx = batch_idx * BATCH_SIZE
-        end_idx = min(start_idx + BATCH_SIZE, len(nodes))
-        batch_nodes = nodes[start_idx:end_idx]
-        
-        print(f"验证第 {batch_idx + 1}/{total_batches} 批 ({start_idx + 1}-{end_idx} 个节点)...")
-        
-        prompt = construct_validation_prompt(batch_nodes, rules)
-        
-        model_response = call_deepseek_api(
-            prompt,
-            app.config['API_MODEL_DEFAULT'],
-            app.config['API_KEY_DEFAULT'],
-            app.config['API_URL_DEFAULT']
-        )
-        
-        try:
-            print(f"API响应: {model_response[:200]}...")
-            
-            cleaned_response = model_response.strip()
-            
-            if cleaned_response.startswith('[') and not cleaned_response.endswith(']'):
-                import re
-                last_brace = cleaned_response.rfind('}')
-                if last_brace != -1:
-                    cleaned_response = cleaned_response[:last_brace+1] + ']'
-            
-            try:
-                batch_results = json.loads(cleaned_response)
-                if not isinstance(batch_results, list):
-                    batch_results = [batch_results]
-            except json.JSONDecodeError:
-                import re
-                json_match = re.search(r'\[\s*\{[\s\S]*?\}\s*\]', cleaned_response)
-                if json_match:
-                    batch_results = json.loads(json_match.group(0))
-                else:
-                    batch_results = generate_default_results(batch_nodes)
-            
-            all_results.extend(batch_results)
-            print(f"  本批验证完成，获得 {len(batch_results)} 个结果")
-            
-        except Exception as e:
-            print(f"解析响应失败: {str(e)}")
-            all_results.extend(generate_default_results(batch_nodes))
-    
-    root_result = {
+    return nodes
+
+def root_validation_result(req_tree):
+    """根节点的验证结果"""
+    return {
         'id': 'root',
         'name': req_tree.get('label', 'root'),
         'result': True,
         'reason': '根节点，无对应规范要求。',
         'parent_id': None
     }
+
+def iter_validate_batches(nodes, rules, doc_id=None, parent_ids=None, match_options=None, checkpoint=None):
+    """逐批产出节点的验证结论 (已完成批数, 总批数, 结论列表)
+    
+    先产出一次已完成批数为0的结论，包含本地检查和节点缓存命中的节点；其余节点按token预算分批并发调用大模型，
+    每完成一批立即产出该批的结论。同时进行的请求数由VALIDATE_MAX_WORKERS限制。
+    调用方提前结束迭代时，尚未开始的批次会被取消。只验证部分节点时，parent_ids传入整棵树中有下级节点的节点ID。
+    match_options为规则相似度匹配阈值，为None时不按相似度匹配规则。
+    checkpoint为需求树内容哈希，指定时每完成一批即追加到文档的检查点日志，中断后再次验证时直接恢复已完成批次的结论。
+    """
+    if match_options:
+        match_rules(nodes, rules, match_options)
+    
+    # 无对应规则、内容为空等节点在本地直接得出结论，不占用提示词
+    results_by_id = {}
+    if app.config.get('VALIDATE_LOCAL_PRECHECK', True):
+        if parent_ids is None:
+            parent_ids = {node['parent_id'] for node in nodes}
+        for node in nodes:
+            verdict = precheck_node(node, rules, parent_ids)
+            if verdict:
+                results_by_id[node['id']] = node_result(node, verdict[0], verdict[1], 'local')
+    remaining = [node for node in nodes if node['id'] not in results_by_id]
+    print(f"本地检查得出结论 {len(results_by_id)} 个节点")
     
-    return [root_result] + all_results
+    # 上次验证中断前已完成的批次不再重复调用大模型
+    if checkpoint and doc_id:
+        restored, restored_batches = load_checkpoint(doc_id, checkpoint)
+        restored_nodes = [node for node in remaining if node['id'] in restored]
+        for node in restored_nodes:
+            results_by_id[node['id']] = restored[node['id']]
+        if restored_nodes:
+            print(f"从检查点日志的 {restored_batches} 批中恢复 {len(restored_nodes)} 个节点的结论")
+        remaining = [node for node in remaining if node['id'] not in results_by_id]
+    
+    # 内容、规则和模型都未变化的节点直接复用缓存的结论，只有未命中的节点发给大模型
+    model = app.config['API_MODEL_DEFAULT']
+    cache_keys = {node['id']: compute_node_cache_key(node, rules, model) for node in remaining}
+    cached = cache_get_many(VALIDATE_NODE_CACHE_NAMESPACE, cache_keys.values())
+    for node in remaining:
+        hit = cached.get(cache_keys[node['id']])
+        if hit:
+            results_by_id[node['id']] = node_result(node, hit['result'], hit['reason'], 'cache')
+    
+    pending = [node for node in remaining if node['id'] not in results_by_id]
+    print(f"节点验证缓存命中 {len(remaining) - len(pending)} 个，需调用大模型验证 {len(pending)} 个")
+    
+    batches = pack_batches(pending, rules)
+    total_batches = len(batches)
+    yield 0, total_batches, list(results_by_id.values())
+    if not batches:
+        return
+    
+    print(f"按token预算分为 {total_batches} 批，每批 {min(map(len, batches))}-{max(map(len, batches))} 个节点")
+    max_workers = app.config.get('VALIDATE_MAX_WORKERS', 4)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(validate_one_batch, batch_idx, total_batches, batch_nodes, rules, doc_id): batch_idx
+            for batch_idx, batch_nodes in enumerate(batches)
+        }
+        def save_batch(future):
+            """缓存一批的结论并追加到检查点日志，只保存大模型实际给出的结论，默认结果下次仍会重新验证"""
+            batch_results = future.result()
+            cache_put_many(VALIDATE_NODE_CACHE_NAMESPACE, {
+                cache_keys[result['id']]: {'result': result['result'], 'reason': result['reason']}
+                for result in batch_results if result['source'] == 'llm'
+            })
+            if checkpoint and doc_id:
+                verified = [result for result in batch_results if not is_unverified(result)]
+                if verified:
+                    append_checkpoint(doc_id, checkpoint, futures[future], verified)
+            return batch_results
+        
+        saved = set()
+        try:
+            # 结论在当前线程中产出和保存，调用方可以直接访问数据库
+            for done, future in enumerate(as_completed(futures), 1):
+                batch_results = save_batch(future)
+                saved.add(future)
+                yield done, total_batches, batch_results
+        finally:
+            executor.shutdown(cancel_futures=True)
+            # 调用方提前结束迭代时，已经开始的批次仍会完成，其结论同样保存，下次验证时不再重复调用
+            for future in futures:
+                if future not in saved and not future.cancelled():
+                    save_batch(future)
+
+def validate_batch(req_tree, rules, progress=None, doc_id=None, match_options=None, checkpoint=None):
+    """批处理验证需求树，各批并发调用大模型，结果按节点原始顺序返回
+    
+    总耗时接近最慢的一批而不是各批之和。progress为可选的进度回调，每完成一批调用 progress(已完成批数, 总批数)。
+    """
+    nodes = validation_nodes(req_tree)
+    if not nodes:
+        return []
+    
+    results_by_id = {}
+    for done, total_batches, results in iter_validate_batches(
+        nodes, rules, doc_id, match_options=match_options, checkpoint=checkpoint
+    ):
+        for result in results:
+            results_by_id[result['id']] = result
+        if progress and done:
+            progress(done, total_batches)
+    
+    return [root_validation_result(req_tree)] + [results_by_id[node['id']] for node in nodes]
 
 def collect_nodes(node, nodes, parent_id=None):
     """收集需求树中的所有节点"""
@@ -296,8 +564,77 @@ def collect_nodes(node, nodes, parent_id=None):
     for child in children:
         collect_nodes(child, nodes, node['id'])
 
+def resolve_rule(node, rules):
+    """按节点内容开头的标题号查找对应规则，找不到时依次尝试上级标题号、节点名称和相似度匹配的规则
+    
+    返回 (标题号, 规则文本)，没有匹配的规则时规则文本为'无对应规则'。
+    """
+    title_number, _, rule = rules.resolve(node.get('original_text'), node['name'])
+    if rule == NO_RULE and node.get('rule_match'):
+        rule = rules[node['rule_match']['rule']]
+    return title_number, rule
+
+def match_rules(nodes, rules, match_options):
+    """为标题号和名称都找不到规则的节点，按名称和内容与规则的相似度匹配规则，记录在节点的rule_match中
+    
+    所有待匹配节点一次向量化，与规则矩阵做一次矩阵乘法得到相似度。
+    """
+    unmatched = [node for node in nodes if resolve_rule(node, rules)[1] == NO_RULE]
+    if not unmatched:
+        return
+    
+    content_chars = app.config.get('VALIDATE_RULE_MATCH_CONTENT_CHARS', 300)
+    texts = [weighted_text(node['name'], (node.get('original_text') or '')[:content_chars]) for node in unmatched]
+    matches = rules.index.match(texts, match_options['min_score'], match_options['min_margin'])
+    matched = 0
+    for node, match in zip(unmatched, matches):
+        if match:
+            node['rule_match'] = match
+            matched += 1
+    print(f"按相似度为 {matched}/{len(unmatched)} 个无对应规则的节点匹配到规则")
+
+def precheck_node(node, rules, parent_ids):
+    """不调用大模型即可确定结论的节点返回 (result, reason)，需要大模型判断时返回None
+    
+    parent_ids为有下级节点的节点ID集合。标题号、名称和相似度匹配都找不到规则的节点无需审查；
+    自身没有内容的章节标题由下级节点承载内容；有规则要求但内容为空的节点判为不合规。
+    """
+    _, rule = resolve_rule(node, rules)
+    if rule == NO_RULE:
+        return True, '无对应规范要求，无需审查。'
+    if (node.get('original_text') or '').strip():
+        return None
+    if node['id'] in parent_ids:
+        return True, '章节标题，具体内容由下级节点描述。'
+    return False, '节点内容为空，未按规范要求编写相应内容。'
+
+def compute_node_cache_key(node, rules, model):
+    """节点验证缓存的键：节点名称和内容、对应规则文本、模型和提示词版本的哈希"""
+    _, rule = resolve_rule(node, rules)
+    key_str = json.dumps(
+        [VALIDATE_PROMPT_VERSION, model, rule, node.get('name'), node.get('original_text')],
+        ensure_ascii=False
+    )
+    return hashlib.md5(key_str.encode('utf-8')).hexdigest()
+
+def format_prompt_rule(rule_id, rule):
+    """构造提示词规范列表中的一条规范"""
+    return f"\n## 规范 {rule_id}\n{rule}\n"
+
+def format_prompt_node(index, node, title_number, rule_id):
+    """构造提示词中单个节点的部分，规范正文通过编号引用规范列表"""
+    original_text = node.get('original_text') or ''
+    
+    text = f"\n## 节点 {index}\n"
+    text += f"ID: {node['id']}\n"
+    text += f"名称: {node['name']}\n"
+    text += f"标题号: {title_number or '无'}\n"
+    text += f"适用规范: {rule_id}\n"
+    text += f"# 文档内容\n{original_text}\n"
+    return text
+
 def construct_validation_prompt(nodes, rules):
-    """构造验证提示词，按照标题号逐条验证"""
+    """构造验证提示词，按照标题号逐条验证，相同的规范正文只列出一次"""
     prompt = """你是一个文档审查专家，如下是一组文档规范及对应的文档内容。请你根据规范，判断文档内容是否符合规范，返回一个JSON，JSON格式应当如下，用result（bool）标明是否合规，用reason（String）简要说明判断的依据：
 {
   "result": false,
@@ -317,37 +654,20 @@ def construct_validation_prompt(nodes, rules):
 - reason: 简要说明判断依据
 - parent_id: 父节点ID
 
+每个节点的"适用规范"为下方规范列表中的编号，请按该编号对应的规范判断。
 """
     
+    rule_ids = {}
+    node_sections = []
     for i, node in enumerate(nodes):
-        title_number = None
-        import re
-        original_text = node.get('original_text') or ''
-        match = re.match(r'^(\d+(\.\d+)*)', original_text)
-        if match:
-            title_number = match.group(1)
-        
-        rule = '无对应规则'
-        if title_number:
-            if title_number in rules:
-                rule = rules[title_number]
-            else:
-                parts = title_number.split('.')
-                for j in range(len(parts)-1, 0, -1):
-                    parent_title = '.'.join(parts[:j])
-                    if parent_title in rules:
-                        rule = rules[parent_title]
-                        break
-        
-        if rule == '无对应规则':
-            rule = rules.get(node['name'], '无对应规则')
-        
-        prompt += f"\n## 节点 {i+1}\n"
-        prompt += f"ID: {node['id']}\n"
-        prompt += f"名称: {node['name']}\n"
-        prompt += f"标题号: {title_number or '无'}\n"
-        prompt += f"# 文档规范\n{rule}\n"
-        prompt += f"# 文档内容\n{original_text}\n"
+        title_number, rule = resolve_rule(node, rules)
+        rule_id = rule_ids.setdefault(rule, f"R{len(rule_ids) + 1}")
+        node_sections.append(format_prompt_node(i + 1, node, title_number, rule_id))
+    
+    prompt += "\n# 规范列表\n"
+    prompt += ''.join(format_prompt_rule(rule_id, rule) for rule, rule_id in rule_ids.items())
+    prompt += "\n# 待审查节点\n"
+    prompt += ''.join(node_sections)
     
     prompt += "\n请严格按照以下格式返回验证结果，不要包含其他无关内容：\n"
     prompt += "[\n"
@@ -357,55 +677,11 @@ def construct_validation_prompt(nodes, rules):
     
     return prompt
 
-def call_deepseek_api(prompt, model, api_key, api_url):
-    """调用DeepSeek大模型API"""
-    headers = {
-        'Content-Type': 'application/json',
-        'Authorization': f'Bearer {api_key}'
-    }
-    
-    data = {
-        'model': model,
-        'messages': [
-            {
-                'role': 'system',
-                'content': '你是一个专业的需求文档审查专家，精通软件工程和需求分析。'
-            },
-            {
-                'role': 'user',
-                'content': prompt
-            }
-        ],
-        'temperature': 0.3,
-        'max_tokens': 1000
-    }
-    
-    try:
-        session = requests.Session()
-        session.trust_env = False
-        
-        response = session.post(
-            api_url + '/chat/completions',
-            headers=headers,
-            json=data,
-            timeout=app.config.get('API_TIMEOUT', 30)
-        )
-        response.raise_for_status()
-        result = response.json()
-        return result['choices'][0]['message']['content']
-    except Exception as e:
-        print(f"API调用失败: {str(e)}")
-        return '{"result": true, "reason": "由于网络原因，大模型验证暂时不可用，默认标记为合规。"}'
-
 def generate_default_results(nodes):
-    """生成默认验证结果"""
+    """生成默认验证结果，标记为未经验证，可通过继续验证接口重新验证"""
     results = []
     for node in nodes:
-        results.append({
-            'id': node['id'],
-            'name': node['name'],
-            'result': True,
-            'reason': '由于大模型验证暂时不可用，默认标记为合规。',
-            'parent_id': node.get('parent_id')
-        })
+        result = node_result(node, None, '由于大模型验证暂时不可用，该节点尚未验证。', 'default')
+        result['verified'] = False
+        results.append(result)
     return results
@@ -0,0 +1,87 @@
+import math
+import re
+import numpy as np
+
+# 只保留汉字和字母，标点、数字和空白不参与相似度计算
+NON_WORD_PATTERN = re.compile(r'[\W\d_]+')
+# 规则标题与正文以冒号或空白分隔
+RULE_HEADING_PATTERN = re.compile(r'[：:\s]')
+NGRAM_RANGE = (1, 2)
+# 标题在文本中重复的次数，使标题中的字词比正文的权重更高
+HEADING_WEIGHT = 3
+
+def extract_ngrams(text):
+    """统计文本的字符n-gram"""
+    text = NON_WORD_PATTERN.sub('', (text or '').lower())
+    counts = {}
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(text) - n + 1):
+            gram = text[i:i + n]
+            counts[gram] = counts.get(gram, 0) + 1
+    return counts
+
+def rule_heading(rule):
+    """规则文本开头的标题，如 '标识：本条应描述...' 中的 '标识'"""
+    return RULE_HEADING_PATTERN.split(rule.strip(), 1)[0]
+
+def weighted_text(heading, body):
+    """标题重复HEADING_WEIGHT次后接正文"""
+    return ' '.join([heading] * HEADING_WEIGHT + [body or ''])
+
+class RuleIndex:
+    """规则的字符n-gram TF-IDF索引：每条规则一行、L2归一化的矩阵
+
+    一组节点的文本向量化后与规则矩阵做一次矩阵乘法，即得到每个节点与每条规则的余弦相似度。
+    """
+
+    def __init__(self, rules):
+        self.rule_keys = list(rules.keys())
+        documents = [extract_ngrams(weighted_text(rule_heading(rules[key]), rules[key])) for key in self.rule_keys]
+
+        self.vocabulary = {}
+        for counts in documents:
+            for gram in counts:
+                self.vocabulary.setdefault(gram, len(self.vocabulary))
+
+        document_frequency = np.zeros(len(self.vocabulary))
+        for counts in documents:
+            document_frequency[[self.vocabulary[gram] for gram in counts]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+        self.matrix = self.vectorize_counts(documents)
+
+    def vectorize_counts(self, documents):
+        """将n-gram计数转换为L2归一化的TF-IDF矩阵，词表外的n-gram忽略"""
+        matrix = np.zeros((len(documents), len(self.vocabulary)))
+        for row, counts in enumerate(documents):
+            for gram, count in counts.items():
+                column = self.vocabulary.get(gram)
+                if column is not None:
+                    matrix[row, column] = 1 + math.log(count)
+        matrix *= self.idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+    def match(self, texts, min_score, min_margin=0.0):
+        """为每段文本返回最相似的规则 {'rule': 规则标题号, 'score': 相似度}
+
+        相似度低于min_score，或与第二相似的规则差距不足min_margin时返回None。
+        """
+        if not texts or not self.rule_keys:
+            return [None] * len(texts)
+
+        scores = self.vectorize_counts([extract_ngrams(text) for text in texts]) @ self.matrix.T
+        order = np.argsort(scores, axis=1)
+        rows = np.arange(len(texts))
+        best = scores[rows, order[:, -1]]
+        second = scores[rows, order[:, -2]] if len(self.rule_keys) > 1 else np.zeros(len(texts))
+
+        matches = []
+        for row in rows:
+            if best[row] < min_score or best[row] - second[row] < min_margin:
+                matches.append(None)
+                continue
+            matches.append({
+                'rule': self.rule_keys[order[row, -1]],
+                'score': round(float(best[row]), 4)
+            })
+        return matches
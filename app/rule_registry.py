@@ -0,0 +1,193 @@
+from app import app
+from app.rule_index import RuleIndex
+import os
+import re
+import threading
+
+SECTION_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)\s*(.+)$')
+TITLE_NUMBER_PATTERN = re.compile(r'^(\d+(?:\.\d+)*)')
+NO_RULE = '无对应规则'
+# 规则查找方式的版本，查找方式变化后同一需求树对应的规则不同，已保存的验证结果不再复用
+RULE_RESOLUTION_VERSION = 3
+
+class RuleSet:
+    """编译后的附录规则：标题号 -> 规则文本
+
+    解析过的标题号会记住其最近的上级规则，同一标题号再次查找时只需一次字典查询。
+    相似度索引在首次按内容匹配规则时构建，随规则集一起在附录文件修改后重建。
+    """
+
+    def __init__(self, name, rules, source=None, mtime=None):
+        self.name = name
+        self.rules = rules
+        self.source = source
+        self.mtime = mtime
+        self._resolved = {}
+        self._index = None
+
+    def __contains__(self, title_number):
+        return title_number in self.rules
+
+    def __getitem__(self, title_number):
+        return self.rules[title_number]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def get(self, title_number, default=None):
+        return self.rules.get(title_number, default)
+
+    def items(self):
+        return self.rules.items()
+
+    @property
+    def index(self):
+        """规则的字符n-gram TF-IDF相似度索引"""
+        if self._index is None:
+            self._index = RuleIndex(self.rules)
+        return self._index
+
+    def resolve_number(self, title_number):
+        """查找标题号本身或最近上级标题号的规则，返回 (规则标题号, 规则文本)，找不到时返回 (None, None)
+
+        沿标题号从右向左截断，最多查找标题号层级数次。
+        """
+        if title_number in self._resolved:
+            return self._resolved[title_number]
+
+        found = (None, None)
+        prefix = title_number
+        while prefix:
+            if prefix in self.rules:
+                found = (prefix, self.rules[prefix])
+                break
+            cut = prefix.rfind('.')
+            prefix = prefix[:cut] if cut > 0 else ''
+
+        self._resolved[title_number] = found
+        return found
+
+    def resolve(self, original_text, name=None):
+        """按节点名称开头的标题号查找规则，名称中没有标题号时才使用内容开头的标题号，最后尝试节点名称本身
+
+        节点名称即标题（如 '3.2.1 工作流程'）；内容开头的编号多为列表序号（如 '1. 软件启动时间≤1s'），只在名称没有标题号时使用。
+        返回 (标题号, 规则标题号, 规则文本)，没有匹配的规则时规则文本为'无对应规则'。
+        """
+        rule_key, rule = None, None
+        match = TITLE_NUMBER_PATTERN.match((name or '').strip()) \
+            or TITLE_NUMBER_PATTERN.match((original_text or '').strip())
+        title_number = match.group(1) if match else None
+        if title_number:
+            rule_key, rule = self.resolve_number(title_number)
+        if rule is None and name in self.rules:
+            rule_key, rule = name, self.rules[name]
+        return title_number, rule_key, rule if rule is not None else NO_RULE
+
+def compile_rule_file(file_path):
+    """解析附录文件：以标题号开头的行开始一条规则，后续行并入该规则"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    rules = {}
+    current_section = ''
+    current_content = []
+
+    for line in content.strip().split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+
+        section_match = SECTION_PATTERN.match(line)
+        if section_match:
+            if current_section:
+                rules[current_section] = ' '.join(current_content)
+
+            current_section = section_match.group(1)
+            current_content = [section_match.group(2)]
+        else:
+            current_content.append(line)
+
+    if current_section:
+        rules[current_section] = ' '.join(current_content)
+
+    return rules
+
+def get_default_appendix_j_rules():
+    """获取默认的附录J规则"""
+    return {
+        '1': '范围：本章应描述本文档所适用系统和软件的完整标识，适用时，包括其标识号、名称、缩略名、版本号和发布号；概述本文档适用的系统和软件的用途；描述系统和软件的一般特性；概述系统开发、运行和维护的历史；标识项目的需方、用户、开发方和保障机构等；标识当前和计划的运行现场；列出其他有关文档；概述本文档的用途和内容，并描述与它的使用有关的安全保密方面的要求。',
+        '1.1': '标识：本条应描述本文档所适用系统和软件的完整标识，适用时，包括其标识号、名称、缩略名、版本号和发布号。',
+        '1.2': '系统概述：本条应概述本文档适用的系统和软件的用途；描述系统和软件的一般特性（如规模、安全性、可靠性、实时性、技术风险等特性）；概述系统开发、运行和维护的历史；标识项目的需方、用户、开发方和保障机构等；标识当前和计划的运行现场；列出其他有关文档。',
+        '1.3': '文档概述：本条应概述本文档的用途和内容，并描述与它的使用有关的安全保密方面的要求。',
+        '2': '引用文档：本章应列出引用文档的编号、标题、编写单位、修订版及日期，还应给出不能通过正常渠道得到的文档的来源。',
+        '3': '需求：本章应分为如下小条规定CSCI需求，即作为CSCI验收条件的CSCI特征。CSCI需求是为满足分配给该CSCI的系统需求而形成的软件需求。每条需求应指定项目唯一的标识符以便测试和追踪，而且应以一种能为其定义具体测试对象的方式来描述。每条需求应注明所采用的合格性方法（见第4章），还应注明与系统或子系统需求的可追踪性（或在第5章给出）。',
+        '3.1': '要求的状态和方式：如果要求CSCI在多种状态或方式下运行，并且不同的状态或方式具有不同的需求，则应标识和定义每一状态和方式。状态和方式的例子包括：空闲、就绪、活动、事后分析、训练、降级、紧急情况、后备、战时和平时等。可以仅用状态描述CSCI，也可以仅用方式、用方式中的状态、状态中的方式、或其他有效的方案描述CSCI。如果不需要多种状态和方式，应如实陈述，而不需要进行人为的区分；如果需要多种状态和/或方式，应使本规格说明中的每个需求或每组需求与这些状态和方式相对应，对应关系可以在本条或本条所引用的附录中，通过表格或其他方式加以指明，也可以在该需求出现的章条中加以说明。',
+        '3.2': 'CSCI能力需求：本条应逐一列出与CSCI各个能力相关的需求，可分为若干子条。"CSCI能力需求"中的"能力"为一组相关需求，可用"功能"、"主题"、"目标"、或其他适合表示需求的词替代。',
+        '3.3': 'CSCI外部接口需求：本条可分为若干个小条来规定关于CSCI的外部接口的需求（若有）。本条可引用一个或多个接口需求规格说明（IRS）或包含这些需求的其他文档。',
+        '3.4': 'CSCI内部接口需求：本条应指明施加于CSCI内部接口的需求（若有）。如果所有内部接口都留待设计时再明确，那么应在此如实陈述。如果施加了这样的需求，应按3.3要求描述。',
+        '3.5': 'CSCI内部数据需求：本条应指明施加于CSCI内部数据的需求（若有），包括对CSCI中数据库和数据文件的需求（若有）。如果关于内部数据的所有决策都留待设计时再考虑，那么应在此如实陈述。如果施加了这样的需求，应按3.3.Xc）和3.3.Xd）要求描述。',
+        '3.6': '适应性需求：（若有）本条应指明与CSCI安装相关的数据需求（如场地的经纬度或位置编码），应描述CSCI使用要求的运行参数（如与使用相关的目标设置或数据记录等方面参数），这些运行参数可能会根据运行需要而改变。',
+        '3.7': '保密性（Security）需求：（若有）本条应指明与维护保密性有关的CSCI需求。（若适用）这些需求应包括：CSCI必须在其中运行的保密性环境、所提供的保密性的类型和级别、CSCI必须经受的保密性风险、减少此类风险所需的安全措施、必须遵循的保密性政策、CSCI必须具备的保密性责任、保密性认证认可必须满足的准则等。',
+        '3.8': '安全性（Safety）需求：（若有）本条应指明关于防止或尽可能降低对人员、财产和物理环境产生意外危险的CSCI安全性需求。例子包括：CSCI必须提供的安全措施，以便防止意外动作（例如意外地发出一个"自动导航关闭"命令）和无动作（例如发出"自动导航关闭"命令失败）。本条还应包括关于系统核部件的CSCI需求（若有），若适用应包括预防意外爆炸以及与核安全规则保持一致等方面的需求。',
+        '3.9': 'CSCI环境适应性需求：（若有）本条应指明CSCI的运行环境需求，例如运行CSCI的计算机硬件和操作系统（对计算机资源的其他需求见3.11）。',
+        '3.10': '其他质量特性：本条应指明合同规定的或由更高一层规格说明派生出的CSCI其他质量特性方面的需求，其中包括：可靠性、测试性，维护性等。',
+        '3.11': '计算机资源需求：本条应指明CSCI必须使用的计算机硬件的需求、计算机硬件资源使用需求、计算机软件需求和计算机通信需求。',
+        '3.12': '设计和实现约束：本条应指明约束CSCI的设计和实现的需求（若有）。这些需求可引用相应的商用或军用标准和规范来指定。',
+        '3.13': '人员相关需求：（若有）本条应描述CSCI需求，包括与CSCI使用或保障人员有关的容纳人员的数量、技能等级、工作周期、必需的训练以及其他的信息，例如要求允许多少用户同时工作，以及内置的帮助和培训短片等方面的需求：也包括施加于CSCI的人机工程需求（若有）。',
+        '3.14': '训练相关需求：（若有）本条应指明与训练相关的CSCI需求，如包括在CSCI中的训练软件。',
+        '3.15': '软件保障需求：本条应指明与软件保障考虑有关的CSCI需求（若有）。这些考虑可以包括：对系统维护、软件保障、系统运输方式、补给系统的要求、对现有设施的影响和对现有设备的影响。',
+        '3.16': '包装需求：本条应指明为了交付而对CSCI进行包装、标记和处理（例如用光盘提交，并按规定要求对光盘标记和包装）的需求（若有），可引用适用的标准。',
+        '3.17': '其他需求：本条应指明上述各条未能覆盖的其他CSCI需求（若有）。',
+        '3.18': '需求的优先顺序和关键性：（若适用）本条应指明本规格说明中各需求的优先次序、关键性或表示其相对重要性的权重。例如标识出对安全性和保密性关键的需求，以便进行特殊处理。如果所有需求具有相等的权重，本条应如实说明。',
+        '4': '合格性规定：本条应定义一组合格性检验方法，针对第3章中的每个需求指定确定需求得到满足所使用的方法。可用表格形式表述，或为第3章中的每个需求注明所使用的方法。',
+        '5': '需求可追踪性：本章应描述从本规格说明中的每一个CSCI需求，到所涉及的系统/子系统需求的可追踪性；从已分配给本CSCI的每一个系统/子系统需求，到所涉及的CSCI需求的可追踪性。',
+        '6': '注释：本章应包括有助于了解文档的所有信息（例如：背景、术语、缩略语或公式）。'
+    }
+
+# 附录名称 -> (APPENDICES_FOLDER中的文件名, 文件缺失或解析失败时的默认规则)
+APPENDICES = {
+    'appendix_j': ('438C-2021附录J.txt', get_default_appendix_j_rules)
+}
+
+_rule_sets = {}
+_registry_lock = threading.Lock()
+
+def register_appendix(name, filename, default_factory=None):
+    """注册附录或标准，首次使用时才加载"""
+    APPENDICES[name] = (filename, default_factory)
+    _rule_sets.pop(name, None)
+
+def get_rule_set(name):
+    """获取编译后的规则集，附录文件修改后自动重新编译，未注册的名称返回空规则集"""
+    if name not in APPENDICES:
+        return RuleSet(name, {})
+
+    filename, default_factory = APPENDICES[name]
+    file_path = os.path.join(app.config['APPENDICES_FOLDER'], filename)
+    try:
+        mtime = os.stat(file_path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    rule_set = _rule_sets.get(name)
+    if rule_set is not None and rule_set.mtime == mtime:
+        return rule_set
+
+    with _registry_lock:
+        rule_set = _rule_sets.get(name)
+        if rule_set is not None and rule_set.mtime == mtime:
+            return rule_set
+
+        rules = None
+        if mtime is not None:
+            try:
+                rules = compile_rule_file(file_path)
+                print(f"已编译附录规则 {name}: {len(rules)} 条")
+            except Exception as e:
+                print(f"加载附录文件失败: {str(e)}")
+        if rules is None:
+            rules = default_factory() if default_factory else {}
+
+        rule_set = RuleSet(name, rules, file_path if mtime is not None else None, mtime)
+        _rule_sets[name] = rule_set
+        return rule_set
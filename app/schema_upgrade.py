@@ -0,0 +1,89 @@
+from app.models import db
+from sqlalchemy import inspect, text
+
+def add_missing_columns(table, inspector):
+    """为已有的表补充模型中新增的列及其索引，返回补充的列名
+
+    create_all只创建缺失的表，不会修改已有的表。新增的列都允许为空，直接ALTER TABLE ADD COLUMN。
+    """
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if not missing:
+        return []
+
+    dialect = db.engine.dialect
+    with db.engine.begin() as conn:
+        for column in missing:
+            column_type = column.type.compile(dialect=dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        for index in table.indexes:
+            if any(column.name in index.columns for column in missing):
+                index.create(bind=conn, checkfirst=True)
+    return [column.name for column in missing]
+
+def relaxed_columns(table, inspector):
+    """模型中已允许为空、数据库中仍为NOT NULL的列"""
+    existing = {column['name']: column for column in inspector.get_columns(table.name)}
+    return [column for column in table.columns
+            if column.nullable and not column.primary_key
+            and column.name in existing and not existing[column.name]['nullable']]
+
+def rebuild_sqlite_table(table, inspector):
+    """SQLite不能修改列的约束，按当前模型重建表并复制数据
+
+    legacy_alter_table使改名不改写其他表对该表的外键引用，重建后的表沿用原表名，引用保持有效。
+    """
+    old_name = f'{table.name}_old'
+    common = [column['name'] for column in inspector.get_columns(table.name) if column['name'] in table.columns]
+    column_list = ', '.join(common)
+    with db.engine.begin() as conn:
+        conn.execute(text('PRAGMA legacy_alter_table = ON'))
+        for index in inspector.get_indexes(table.name):
+            conn.execute(text(f'DROP INDEX IF EXISTS {index["name"]}'))
+        conn.execute(text(f'ALTER TABLE {table.name} RENAME TO {old_name}'))
+        table.create(bind=conn)
+        conn.execute(text(f'INSERT INTO {table.name} ({column_list}) SELECT {column_list} FROM {old_name}'))
+        conn.execute(text(f'DROP TABLE {old_name}'))
+        conn.execute(text('PRAGMA legacy_alter_table = OFF'))
+
+def relax_not_null(table, inspector):
+    """取消模型中已允许为空的列在数据库中的NOT NULL约束，返回修改的列名
+
+    旧记录直接保存需求树和验证结果（tree_json / result_json），新记录只引用content_hash，这两列需允许为空。
+    """
+    columns = relaxed_columns(table, inspector)
+    if not columns:
+        return []
+
+    dialect = db.engine.dialect
+    if dialect.name == 'sqlite':
+        rebuild_sqlite_table(table, inspector)
+    else:
+        with db.engine.begin() as conn:
+            for column in columns:
+                if dialect.name == 'mysql':
+                    column_type = column.type.compile(dialect=dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} MODIFY {column.name} {column_type} NULL'))
+                else:
+                    conn.execute(text(f'ALTER TABLE {table.name} ALTER COLUMN {column.name} DROP NOT NULL'))
+    return [column.name for column in columns]
+
+def upgrade_schema():
+    """启动时将已有数据库升级到当前模型，可重复执行"""
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        try:
+            added = add_missing_columns(table, inspector)
+            inspector.clear_cache()
+            relaxed = relax_not_null(table, inspector)
+        except Exception as e:
+            # 多个进程同时启动时其他进程可能已完成升级
+            print(f"升级数据表 {table.name} 失败: {str(e)}")
+            continue
+        if added:
+            print(f"数据表 {table.name} 已补充列: {', '.join(added)}")
+        if relaxed:
+            print(f"数据表 {table.name} 的列已允许为空: {', '.join(relaxed)}")
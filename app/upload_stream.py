@@ -0,0 +1,95 @@
+from app import app
+from werkzeug.formparser import MultiPartParser
+from werkzeug.http import parse_options_header
+from werkzeug.wsgi import get_input_stream
+import hashlib
+import os
+import uuid
+
+# 文件摘要算法，doc_id取摘要的十六进制前32位；blake2b取16字节摘要，正好32位
+HASH_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha256': hashlib.sha256,
+    'blake2b': lambda: hashlib.blake2b(digest_size=16)
+}
+
+def new_file_hasher(algorithm=None):
+    """按配置的算法创建文件摘要对象"""
+    algorithm = algorithm or app.config.get('UPLOAD_HASH_ALGORITHM', 'md5')
+    if algorithm not in HASH_ALGORITHMS:
+        raise ValueError(f"Unsupported hash algorithm: {algorithm}")
+    return HASH_ALGORITHMS[algorithm]()
+
+def file_id(hasher):
+    """由文件摘要得到doc_id"""
+    return hasher.hexdigest()[:32]
+
+def compute_file_hash(filepath, algorithm=None):
+    """读取已保存的文件计算doc_id"""
+    hasher = new_file_hasher(algorithm)
+    buffer_size = app.config.get('UPLOAD_BUFFER_SIZE', 256 * 1024)
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(buffer_size), b""):
+            hasher.update(chunk)
+    return file_id(hasher)
+
+class HashingFile:
+    """写入临时文件的同时计算摘要，上传内容只经过一次"""
+
+    def __init__(self, path, hasher, buffer_size):
+        self.path = path
+        self.hasher = hasher
+        self.size = 0
+        self.file = open(path, 'w+b', buffering=buffer_size)
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+    def discard(self):
+        """关闭并删除临时文件"""
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+def parse_upload(environ, folder=None):
+    """解析multipart请求，文件部分直接写入folder中的临时文件并同时计算摘要
+
+    返回 (表单字段, [(字段名, 原文件名, HashingFile), ...])，按请求中的顺序排列，请求不是multipart时返回 (None, [])。
+    调用方负责对不需要的临时文件调用discard()。
+    """
+    mimetype, options = parse_options_header(environ.get('CONTENT_TYPE', ''))
+    if mimetype != 'multipart/form-data' or not options.get('boundary'):
+        return None, []
+
+    folder = folder or app.config['UPLOAD_FOLDER']
+    buffer_size = app.config.get('UPLOAD_BUFFER_SIZE', 256 * 1024)
+    containers = []
+
+    def stream_factory(total_content_length, content_type, filename=None, content_length=None):
+        # 保留扩展名，按文件类型读取段落时依据扩展名判断
+        temp_filename = f"temp_{uuid.uuid4().hex}{os.path.splitext(filename or '')[1].lower()}"
+        container = HashingFile(os.path.join(folder, temp_filename), new_file_hasher(), buffer_size)
+        containers.append(container)
+        return container
+
+    content_length = environ.get('CONTENT_LENGTH')
+    stream = get_input_stream(environ, max_content_length=app.config.get('MAX_CONTENT_LENGTH'))
+    parser = MultiPartParser(stream_factory=stream_factory, buffer_size=buffer_size)
+    try:
+        form, files = parser.parse(stream, options['boundary'].encode('ascii'),
+                                   int(content_length) if content_length else None)
+    except Exception:
+        for container in containers:
+            container.discard()
+        raise
+
+    uploads = []
+    for name, storage in files.items(multi=True):
+        storage.stream.flush()
+        uploads.append((name, storage.filename, storage.stream))
+    return form, uploads
@@ -0,0 +1,97 @@
+"""解析输出格式对比：完整JSON格式 vs 紧凑格式
+
+用法:
+    python bench_parse_schema.py [文档路径 ...] [--llm] [--repeat N]
+
+默认离线对比：用本地按标题构建的需求树模拟大模型输出，统计两种格式的输出字符数和字节数。
+--llm 按章节实际调用config.py中配置的大模型，统计两种格式的completion tokens和耗时。
+
+已有结果：离线对比中两份示例文档的紧凑格式输出为完整格式的44%～45%字符数（如9172 / 20615）、约64%字节数。
+--llm 模式的completion tokens和耗时尚未实测（需要能访问大模型API的环境），紧凑格式对解析耗时的改善待确认。
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from app import app
+from app.document_text import read_paragraphs
+from app.llm_client import request_chat_completion
+from app.routes.parse import (
+    PARSE_MAX_TOKENS, PARSE_SYSTEM_PROMPT, build_parse_prompt, build_tree_from_headings, split_into_chapters
+)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+
+def to_compact(node):
+    """将完整格式的节点转换为紧凑格式（与build_compact_parse_prompt约定一致）"""
+    compact = {'t': node.get('label', '')}
+    if node.get('content'):
+        compact['c'] = node['content']
+    if node.get('children'):
+        compact['n'] = [to_compact(child) for child in node['children']]
+    return compact
+
+
+def render_outputs(req_tree):
+    """返回 (完整格式输出, 紧凑格式输出)，完整格式按提示词示例的缩进排版"""
+    full = json.dumps({'tree': req_tree}, ensure_ascii=False, indent=2)
+    compact = json.dumps([to_compact(child) for child in req_tree['children']],
+                         ensure_ascii=False, separators=(',', ':'))
+    return full, compact
+
+
+def offline_compare(files):
+    print(f"{'文档':<40}{'格式':<10}{'字符数':>10}{'字节数':>10}{'占比':>8}")
+    for filepath in files:
+        req_tree = build_tree_from_headings(read_paragraphs(filepath), os.path.basename(filepath))
+        if not req_tree:
+            print(f"{os.path.basename(filepath):<40}未识别出标题结构，跳过")
+            continue
+        full, compact = render_outputs(req_tree)
+        for label, output in (('full', full), ('compact', compact)):
+            print(f"{os.path.basename(filepath):<40}{label:<10}{len(output):>10}"
+                  f"{len(output.encode('utf-8')):>10}{len(output) / len(full):>8.0%}")
+
+
+def call_with_usage(prompt):
+    """调用大模型，返回 (耗时秒, completion tokens)"""
+    start = time.perf_counter()
+    result = request_chat_completion(prompt, PARSE_SYSTEM_PROMPT, PARSE_MAX_TOKENS, timeout=300, retries=0)
+    elapsed = time.perf_counter() - start
+    return elapsed, result.get('usage', {}).get('completion_tokens', 0)
+
+
+def llm_compare(files, repeat):
+    print(f"{'文档':<40}{'格式':<10}{'completion tokens':>20}{'耗时(s)':>10}")
+    for filepath in files:
+        chapters = split_into_chapters(read_paragraphs(filepath))
+        for label, compact in (('full', False), ('compact', True)):
+            tokens = elapsed = 0
+            for _ in range(repeat):
+                for chapter in chapters:
+                    seconds, used = call_with_usage(build_parse_prompt(chapter, compact))
+                    tokens += used
+                    elapsed += seconds
+            print(f"{os.path.basename(filepath):<40}{label:<10}{tokens / repeat:>20.0f}{elapsed / repeat:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解析输出格式对比')
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--llm', action='store_true')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(BASE_DIR, '*.docx')))
+    with app.app_context():
+        if args.llm:
+            llm_compare(files, args.repeat)
+        else:
+            offline_compare(files)
+
+
+if __name__ == '__main__':
+    main()
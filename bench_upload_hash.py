@@ -0,0 +1,96 @@
+"""上传接收对比：先保存再读回计算MD5 vs 边接收边写入并计算摘要
+
+用法:
+    python bench_upload_hash.py [--size-mb N] [--repeat N]
+
+生成指定大小的随机文件，构造multipart请求，分别统计原方式（Werkzeug缓存上传内容、
+file.save另存、再按8KB读回计算MD5）和单次写入同时计算摘要（各摘要算法）的耗时。
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from werkzeug.formparser import parse_form_data
+from werkzeug.test import EnvironBuilder
+
+from app import app
+from app.upload_stream import HASH_ALGORITHMS, file_id, parse_upload
+
+
+def build_environ(filepath):
+    """构造上传该文件的multipart请求环境"""
+    f = open(filepath, 'rb')
+    builder = EnvironBuilder(method='POST', data={'file': (f, 'bench.docx'), 'file_type': 'other'})
+    environ = builder.get_environ()
+    builder.close()
+    f.close()
+    return environ
+
+
+def legacy_upload(environ, folder):
+    """原方式：解析请求、另存临时文件、读回计算MD5"""
+    _, _, files = parse_form_data(environ)
+    temp_filepath = os.path.join(folder, 'temp_legacy.docx')
+    files['file'].save(temp_filepath)
+    hash_md5 = hashlib.md5()
+    with open(temp_filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(8192), b""):
+            hash_md5.update(chunk)
+    os.remove(temp_filepath)
+    return hash_md5.hexdigest()
+
+
+def streaming_upload(environ, folder):
+    """新方式：解析请求时直接写入临时文件并计算摘要"""
+    _, uploads = parse_upload(environ, folder)
+    _, _, upload = uploads[0]
+    upload.close()
+    doc_id = file_id(upload.hasher)
+    upload.discard()
+    return doc_id
+
+
+def measure(filepath, folder, upload, repeat):
+    """返回最快一次的耗时（秒），每次重新构造请求，构造时间不计入"""
+    best = None
+    for _ in range(repeat):
+        environ = build_environ(filepath)
+        start = time.perf_counter()
+        upload(environ, folder)
+        elapsed = time.perf_counter() - start
+        environ['wsgi.input'].close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上传接收对比')
+    parser.add_argument('--size-mb', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp()
+    filepath = os.path.join(folder, 'bench.docx')
+    with open(filepath, 'wb') as f:
+        for _ in range(args.size_mb):
+            f.write(os.urandom(1024 * 1024))
+
+    try:
+        with app.app_context():
+            baseline = measure(filepath, folder, legacy_upload, args.repeat)
+            print(f"{'方式':<32}{'耗时(s)':>10}{'MB/s':>10}{'相对原方式':>12}")
+            print(f"{'保存后读回MD5 (8KB)':<32}{baseline:>10.3f}{args.size_mb / baseline:>10.0f}{1:>12.0%}")
+            for algorithm in HASH_ALGORITHMS:
+                app.config['UPLOAD_HASH_ALGORITHM'] = algorithm
+                elapsed = measure(filepath, folder, streaming_upload, args.repeat)
+                print(f"{'边接收边计算 ' + algorithm:<32}{elapsed:>10.3f}{args.size_mb / elapsed:>10.0f}"
+                      f"{elapsed / baseline:>12.0%}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
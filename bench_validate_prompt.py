@@ -0,0 +1,78 @@
+"""验证提示词对比：每个节点重复规范正文 vs 规范去重并按规范分组装批
+
+用法:
+    python bench_validate_prompt.py [文档路径 ...]
+
+离线统计：按标题构建需求树后，分别按三种方式生成全部验证提示词，
+比较批数、估算的输入token总数和每个节点平均的输入token数（不调用大模型）。
+"""
+import argparse
+import glob
+import os
+
+from app import app
+from app.document_text import read_paragraphs
+from app.llm_client import estimate_tokens
+from app.routes.parse import build_tree_from_headings
+from app.routes.validate import (
+    collect_nodes, construct_validation_prompt, load_rules, pack_batches, resolve_rule
+)
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+LEGACY_BATCH_SIZE = 10
+
+
+def legacy_prompt(nodes, rules):
+    """原提示词：每个节点后附完整的规范正文"""
+    prompt = construct_validation_prompt([], rules)
+    for i, node in enumerate(nodes):
+        title_number, rule = resolve_rule(node, rules)
+        prompt += f"\n## 节点 {i + 1}\n"
+        prompt += f"ID: {node['id']}\n"
+        prompt += f"名称: {node['name']}\n"
+        prompt += f"标题号: {title_number or '无'}\n"
+        prompt += f"# 文档规范\n{rule}\n"
+        prompt += f"# 文档内容\n{node.get('original_text') or ''}\n"
+    return prompt
+
+
+def fixed_batches(nodes):
+    return [nodes[start:start + LEGACY_BATCH_SIZE] for start in range(0, len(nodes), LEGACY_BATCH_SIZE)]
+
+
+def measure(batches, build_prompt, rules):
+    """返回 (批数, 输入token估算总数, 字符总数)"""
+    prompts = [build_prompt(batch, rules) for batch in batches]
+    return len(prompts), sum(estimate_tokens(p) for p in prompts), sum(len(p) for p in prompts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='验证提示词对比')
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(BASE_DIR, '*.docx')))
+    with app.app_context():
+        rules = load_rules('appendix_j')
+        print(f"{'文档':<40}{'方式':<24}{'批数':>6}{'输入tokens':>12}{'每节点':>8}{'字符数':>10}")
+        for filepath in files:
+            req_tree = build_tree_from_headings(read_paragraphs(filepath), os.path.basename(filepath))
+            if not req_tree:
+                print(f"{os.path.basename(filepath):<40}未识别出标题结构，跳过")
+                continue
+            nodes = []
+            collect_nodes(req_tree, nodes)
+            nodes = nodes[1:]
+
+            for label, batches, build_prompt in (
+                ('重复规范, 每批10个', fixed_batches(nodes), legacy_prompt),
+                ('规范去重, 每批10个', fixed_batches(nodes), construct_validation_prompt),
+                ('规范去重, 按规范分组装批', pack_batches(nodes, rules), construct_validation_prompt),
+            ):
+                count, tokens, chars = measure(batches, build_prompt, rules)
+                print(f"{os.path.basename(filepath):<40}{label:<24}{count:>6}{tokens:>12}"
+                      f"{tokens / len(nodes):>8.0f}{chars:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,8 +3,21 @@ import os
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
+TEXT_FOLDER = os.path.join(UPLOAD_FOLDER, 'text')  # 上传时提取的文档文本
+RESULT_STORE_FOLDER = os.path.join(BASE_DIR, 'result_store')  # 按内容哈希保存的解析和验证结果
 APPENDICES_FOLDER = os.path.join(BASE_DIR, 'appendices')
 ALLOWED_EXTENSIONS = {'txt', 'docx'}
+UPLOAD_HASH_ALGORITHM = 'md5'  # 上传文件摘要算法：md5 / sha256 / blake2b，doc_id取摘要前32位；修改后同一文件会得到新的doc_id
+UPLOAD_BUFFER_SIZE = 256 * 1024  # 接收上传内容和计算摘要时每次读写的字节数
+MAX_CONTENT_LENGTH = 64 * 1024 * 1024  # 单个请求体的最大字节数，超过时不读取请求体直接返回413；更大的文件使用分片上传
+UPLOAD_PARTIAL_FOLDER = os.path.join(UPLOAD_FOLDER, 'partial')  # 分片上传中的文件
+UPLOAD_MAX_FILE_SIZE = 1024 * 1024 * 1024  # 分片上传的最大文件字节数，创建会话时按声明的大小检查
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # 分片上传每个分片的最大字节数
+UPLOAD_SESSION_TTL = 24 * 3600  # 分片上传会话超过该时间（秒）未更新即清理
+UPLOAD_COMPLETING_TTL = 7 * 24 * 3600  # 正在写入分片或保存文档的会话超过该时间（秒）未更新才清理，避免删除处理中的文件
+UPLOAD_ARCHIVE_MAX_BYTES = 500 * 1024 * 1024  # 批量上传的zip压缩包解压后的最大总字节数
+BULK_UPLOAD_MAX_FILES = 200  # 批量上传一次最多处理的文件数（含压缩包中的文件）
+BULK_UPLOAD_WORKERS = 4  # 批量上传时并行解压、计算摘要和提取文本的线程数
 
 SECRET_KEY = 'your-secret-key-here'
 DEBUG = True
@@ -18,4 +31,33 @@ API_KEY_DEFAULT = "sk-ba7862f60e3e460e88e17dad82e34982"
 API_URL_DEFAULT = "https://api.deepseek.com"
 API_MODEL_DEFAULT = "deepseek-chat"
 
-API_TIMEOUT = 60  # 超时时间（秒）
+API_TIMEOUT = 60  # 读取响应的超时时间（秒）
+API_CONNECT_TIMEOUT = 10  # 建立连接的超时时间（秒）
+API_MAX_RETRIES = 3  # 超时、连接失败、限流和5xx错误的最大重试次数
+API_BACKOFF_BASE = 1  # 重试等待的基数（秒），按指数增长并加随机抖动
+API_BACKOFF_MAX = 30  # 单次重试等待的上限（秒）
+API_POOL_SIZE = 16  # 进程内共享连接池的最大连接数，应不小于并发调用数
+LLM_CALL_LOGGING = True  # 记录每次大模型调用的用量、耗时和结果
+
+# 文档解析配置
+PARSE_MAX_WORKERS = 4  # 按章节并发调用大模型解析的最大线程数
+PARSE_API_TIMEOUT = 120  # 解析输出较长，单独设置读取超时（秒）
+PARSE_COMPACT_SCHEMA = True  # 大模型以紧凑格式输出需求树（短字段名、省略默认值），在本地展开
+
+# 需求验证配置
+VALIDATE_MAX_WORKERS = 4  # 并发验证的最大批数（同时进行的大模型请求数）
+VALIDATE_MAX_PROMPT_TOKENS = 6000  # 每批提示词的估算token上限
+VALIDATE_MAX_OUTPUT_TOKENS = 2000  # 每批模型输出的token上限（同时作为请求的max_tokens）
+VALIDATE_MAX_BATCH_NODES = 30  # 每批最多节点数
+VALIDATE_LOCAL_PRECHECK = True  # 相似度匹配后仍无对应规则、内容为空的节点在本地直接得出结论，不调用大模型
+VALIDATE_RULE_MATCH = True  # 标题号和名称都找不到规则时，按名称和内容的相似度匹配规则
+VALIDATE_RULE_MATCH_MIN_SCORE = 0.3  # 相似度匹配的最低余弦相似度
+VALIDATE_RULE_MATCH_MIN_MARGIN = 0.02  # 最相似规则须比第二相似的规则高出的相似度，避免模棱两可的匹配
+VALIDATE_RULE_MATCH_CONTENT_CHARS = 300  # 参与相似度匹配的节点内容字数
+
+# 后台任务配置
+JOB_WORKER_PROCESSES = 2  # worker.py 默认启动的工作进程数
+JOB_POLL_INTERVAL = 2  # 空闲时轮询任务表的间隔（秒）
+JOB_HEARTBEAT_INTERVAL = 10  # 运行中任务的心跳间隔（秒）
+JOB_STALE_TIMEOUT = 120  # 心跳超时后视为工作进程已退出，任务重新排队（秒）
+JOB_MAX_ATTEMPTS = 3  # 任务最多执行次数
@@ -0,0 +1,90 @@
+import requests
+import io
+import json
+import zipfile
+
+BASE_URL = "http://127.0.0.1:5000"
+
+session = requests.Session()
+session.trust_env = False
+
+def build_archive(members):
+    """在内存中构造zip压缩包"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def test_bulk_upload_api():
+    print("=" * 60)
+    print("测试 /api/upload/bulk 接口 - 批量上传")
+    print("=" * 60)
+
+    first = '1 范围\n本文档描述批量上传测试软件的需求。\n'.encode('utf-8')
+    second = '1 范围\n本文档描述另一个测试软件的需求。\n'.encode('utf-8')
+    archive = build_archive({
+        'docs/second.txt': second,
+        'docs/first_copy.txt': first,
+        'docs/readme.md': b'# not allowed',
+        '__MACOSX/docs/._second.txt': b'metadata'
+    })
+    files = [
+        ('files', ('first.txt', first, 'text/plain')),
+        ('files', ('docs.zip', archive, 'application/zip')),
+        ('files', ('image.png', b'not allowed', 'image/png'))
+    ]
+
+    print("\n1. 上传两个文件（其中一个为zip压缩包）...")
+    try:
+        response = session.post(f"{BASE_URL}/api/upload/bulk", files=files, data={'file_type': 'other'}, timeout=60)
+        if response.status_code == 200:
+            result = response.json()
+            print(f"   ✓ 共 {result['total']} 个文件: {json.dumps(result['counts'], ensure_ascii=False)}")
+            for item in result['results']:
+                source = f"{item['archive']}/" if item.get('archive') else ''
+                print(f"   {source}{item['filename']}: {item['status']} {item['doc_id'] or ''} {item.get('message', '')}")
+        else:
+            print(f"   ✗ 上传失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n2. 再次上传并提交解析和验证任务，已有文档不重复创建...")
+    try:
+        response = session.post(f"{BASE_URL}/api/upload/bulk", files=files,
+                                data={'parse': 'true', 'validate': 'true'}, timeout=60)
+        if response.status_code == 200:
+            result = response.json()
+            created = result['counts'].get('created', 0)
+            if created == 0:
+                print(f"   ✓ 没有新建文档: {json.dumps(result['counts'], ensure_ascii=False)}")
+            else:
+                print(f"   ✗ 重复上传新建了 {created} 个文档")
+        else:
+            print(f"   ✗ 上传失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n3. 上传新文档并提交解析和验证任务...")
+    try:
+        third = '1 范围\n本文档描述第三个测试软件的需求。\n'.encode('utf-8')
+        response = session.post(f"{BASE_URL}/api/upload/bulk",
+                                files=[('files', ('third.txt', third, 'text/plain'))],
+                                data={'parse': 'true', 'validate': 'true'}, timeout=60)
+        if response.status_code == 200:
+            for item in response.json()['results']:
+                jobs = item.get('jobs') or {}
+                print(f"   {item['filename']}: {item['status']} {item['doc_id']}")
+                for kind, job_id in jobs.items():
+                    job = session.get(f"{BASE_URL}/api/jobs/{job_id}", timeout=10).json()
+                    print(f"   ✓ {kind} 任务 {job_id}: {job['status']}，前置任务 {job['depends_on']}")
+        else:
+            print(f"   ✗ 上传失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+if __name__ == "__main__":
+    test_bulk_upload_api()
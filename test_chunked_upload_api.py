@@ -0,0 +1,101 @@
+import requests
+import hashlib
+import os
+
+BASE_URL = "http://127.0.0.1:5000"
+TEST_FILE = "test_data/sample.docx"
+CHUNK_SIZE = 256 * 1024
+
+session = requests.Session()
+session.trust_env = False
+
+def put_chunk(upload_id, content, offset):
+    chunk = content[offset:offset + CHUNK_SIZE]
+    return session.put(f"{BASE_URL}/api/upload/sessions/{upload_id}", params={'offset': offset}, data=chunk,
+                       headers={'X-Chunk-Hash': hashlib.md5(chunk).hexdigest()}, timeout=30)
+
+def test_chunked_upload_api():
+    print("=" * 60)
+    print("测试 /api/upload/sessions 接口 - 分片上传")
+    print("=" * 60)
+
+    if os.path.exists(TEST_FILE):
+        with open(TEST_FILE, 'rb') as f:
+            content = f.read()
+        filename = os.path.basename(TEST_FILE)
+    else:
+        content = ('1 范围\n本文档描述分片上传测试软件的需求。\n' * 20000).encode('utf-8')
+        filename = 'chunked_upload_test.txt'
+
+    print(f"\n1. 创建上传会话，文件 {filename}，{len(content)} 字节...")
+    upload_id = None
+    try:
+        response = session.post(f"{BASE_URL}/api/upload/sessions", json={
+            'filename': filename,
+            'size': len(content),
+            'file_hash': hashlib.md5(content).hexdigest()
+        }, timeout=10)
+        result = response.json()
+        if response.status_code == 201:
+            upload_id = result['upload_id']
+            print(f"   ✓ 会话 {upload_id}，分片上限 {result['chunk_size']} 字节")
+        elif response.status_code == 200 and result.get('cached'):
+            print(f"   ✓ 文档已存在，无需上传: {result['doc_id']}")
+            return
+        else:
+            print(f"   ✗ 创建失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+            return
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+        return
+
+    print("\n2. 上传一半分片后模拟断线，查询偏移继续上传...")
+    try:
+        offset = 0
+        while offset < len(content) // 2:
+            offset = put_chunk(upload_id, content, offset).json()['offset']
+        offset = session.get(f"{BASE_URL}/api/upload/sessions/{upload_id}", timeout=10).json()['offset']
+        print(f"   已接收 {offset} 字节，从该偏移继续")
+        while offset < len(content):
+            response = put_chunk(upload_id, content, offset)
+            if response.status_code != 200:
+                print(f"   ✗ 分片上传失败: {response.status_code} {response.text}")
+                return
+            offset = response.json()['offset']
+        print(f"   ✓ 全部 {offset} 字节已接收")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+        return
+
+    print("\n3. 分片摘要不一致时拒绝写入...")
+    try:
+        response = session.post(f"{BASE_URL}/api/upload/sessions", json={'filename': 'bad_chunk.txt', 'size': 4}, timeout=10)
+        bad_id = response.json()['upload_id']
+        response = session.put(f"{BASE_URL}/api/upload/sessions/{bad_id}", params={'offset': 0}, data=b'abcd',
+                               headers={'X-Chunk-Hash': hashlib.md5(b'abce').hexdigest()}, timeout=10)
+        offset = session.get(f"{BASE_URL}/api/upload/sessions/{bad_id}", timeout=10).json()['offset']
+        if response.status_code == 400 and offset == 0:
+            print("   ✓ 返回400，偏移未变")
+        else:
+            print(f"   ✗ 预期400，实际 {response.status_code}，偏移 {offset}")
+        session.delete(f"{BASE_URL}/api/upload/sessions/{bad_id}", timeout=10)
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n4. 完成上传...")
+    try:
+        response = session.post(f"{BASE_URL}/api/upload/sessions/{upload_id}/complete", timeout=60)
+        if response.status_code == 200:
+            result = response.json()
+            expected = hashlib.md5(content).hexdigest()
+            mark = '✓' if result['doc_id'] == expected or result.get('cached') else '✗'
+            print(f"   {mark} doc_id: {result['doc_id']} (cached: {result['cached']})")
+        else:
+            print(f"   ✗ 完成失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+if __name__ == "__main__":
+    test_chunked_upload_api()
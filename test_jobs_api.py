@@ -0,0 +1,86 @@
+import requests
+import json
+import os
+import time
+
+BASE_URL = "http://127.0.0.1:5000"
+TEST_FILE = r"E:\req_com1\MEMS陀螺软件需求规格说明.docx"
+POLL_INTERVAL = 2
+POLL_TIMEOUT = 600
+
+session = requests.Session()
+session.trust_env = False
+
+def wait_for_job(job):
+    """轮询任务状态直到结束，返回最终状态"""
+    start = time.time()
+    while time.time() - start < POLL_TIMEOUT:
+        response = session.get(f"{BASE_URL}{job['status_url']}", timeout=10)
+        status = response.json()
+        print(f"   状态: {status['status']}, 进度: {status['progress']:.0%}, {status.get('message') or ''}")
+        if status['status'] in ('succeeded', 'failed'):
+            return status
+        time.sleep(POLL_INTERVAL)
+    return None
+
+def test_jobs_api():
+    print("=" * 60)
+    print("测试 /api/jobs 接口 (需先运行 python worker.py)")
+    print("=" * 60)
+
+    print("\n1. 上传测试文件...")
+    try:
+        with open(TEST_FILE, 'rb') as f:
+            files = {
+                'file': (
+                    os.path.basename(TEST_FILE),
+                    f,
+                    'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                )
+            }
+            response = session.post(f"{BASE_URL}/api/upload", files=files, timeout=60)
+
+        if response.status_code == 200:
+            doc_id = response.json().get('doc_id')
+            print(f"   ✓ 文件上传成功, doc_id: {doc_id}")
+        else:
+            print(f"   ✗ 上传失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+            return
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+        return
+
+    for step, kind in ((2, 'parse'), (3, 'validate')):
+        print(f"\n{step}. 提交 {kind} 任务...")
+        try:
+            response = session.post(f"{BASE_URL}/api/jobs/{kind}/{doc_id}", timeout=10)
+            if response.status_code != 202:
+                print(f"   ✗ 提交失败: {response.status_code}")
+                print(f"   响应: {response.text}")
+                return
+            job = response.json()
+            print(f"   ✓ 任务已提交, job_id: {job['job_id']}")
+
+            status = wait_for_job(job)
+            if not status:
+                print("   ✗ 等待任务超时")
+                return
+            if status['status'] == 'failed':
+                print(f"   ✗ 任务失败: {status.get('error')}")
+                return
+
+            response = session.get(f"{BASE_URL}{job['result_url']}", timeout=30)
+            result = response.json()
+            print(f"   ✓ 任务完成, 结果字段: {list(result.keys())}")
+        except Exception as e:
+            print(f"   ✗ 错误: {e}")
+            return
+
+    print("\n" + "=" * 60)
+
+if __name__ == '__main__':
+    try:
+        test_jobs_api()
+    except KeyboardInterrupt:
+        print("\n测试已取消")
@@ -0,0 +1,87 @@
+import requests
+import json
+import os
+import time
+
+BASE_URL = "http://127.0.0.1:5000"
+TEST_FILE = r"E:\req_com1\MEMS陀螺软件需求规格说明.docx"
+
+session = requests.Session()
+session.trust_env = False
+
+def test_parse_stream_api():
+    print("=" * 60)
+    print("测试 /api/parse/<doc_id>/stream 接口 (流式解析)")
+    print("=" * 60)
+
+    print("\n1. 上传测试文件...")
+    try:
+        with open(TEST_FILE, 'rb') as f:
+            files = {
+                'file': (
+                    os.path.basename(TEST_FILE),
+                    f,
+                    'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+                )
+            }
+            response = session.post(f"{BASE_URL}/api/upload", files=files, timeout=60)
+
+        if response.status_code == 200:
+            data = response.json()
+            doc_id = data.get('doc_id')
+            print(f"   ✓ 文件上传成功, doc_id: {doc_id}")
+        else:
+            print(f"   ✗ 上传失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+            return
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+        return
+
+    print("\n2. 调用流式解析接口 (use_llm=true)...")
+    start = time.time()
+    first_node_time = None
+    node_count = 0
+    try:
+        response = session.get(
+            f"{BASE_URL}/api/parse/{doc_id}/stream",
+            params={'use_llm': 'true'},
+            stream=True,
+            timeout=300
+        )
+        if response.status_code != 200:
+            print(f"   ✗ 解析失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+            return
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line.decode('utf-8'))
+            if event['type'] == 'node':
+                node_count += 1
+                if first_node_time is None:
+                    first_node_time = time.time() - start
+                    print(f"   ✓ 首个节点到达耗时: {first_node_time:.2f}秒")
+                node = event['node']
+                print(f"     {node['id']} {node['label']}")
+            elif event['type'] == 'progress':
+                print(f"   正在解析第 {event['chapter']}/{event['total_chapters']} 章")
+            elif event['type'] == 'error':
+                print(f"   ✗ 解析失败: {event['error']}")
+                return
+            elif event['type'] == 'done':
+                print(f"   ✓ 解析完成, 总耗时: {time.time() - start:.2f}秒")
+                print(f"   ✓ 流式节点数: {node_count}")
+                print(f"   ✓ 解析方式: {event.get('parse_method')}")
+                print(f"   ✓ 结果文件: {event.get('output_file')}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n" + "=" * 60)
+
+if __name__ == '__main__':
+    try:
+        test_parse_stream_api()
+    except KeyboardInterrupt:
+        print("\n测试已取消")
@@ -0,0 +1,56 @@
+import requests
+import json
+
+BASE_URL = "http://127.0.0.1:5000"
+TEST_DOC_ID = "bcab12d8-8874-4f8a-aaff-d3ba8e6d214d"
+
+session = requests.Session()
+session.trust_env = False
+
+def print_stats(title, stats):
+    print(f"   {title}: 调用 {stats['calls']} 次 (失败 {stats['failed']}, 重试 {stats['retries']}), "
+          f"输入 {stats['prompt_tokens']} tokens (缓存命中 {stats['cache_hit_rate']:.0%}), "
+          f"输出 {stats['completion_tokens']} tokens, 平均耗时 {stats['avg_latency_ms']} ms")
+
+def test_usage_api():
+    print("=" * 60)
+    print("测试 /api/usage 接口 - 大模型用量统计")
+    print("=" * 60)
+
+    print(f"\n1. 查询文档用量，doc_id: {TEST_DOC_ID}...")
+    try:
+        response = session.get(f"{BASE_URL}/api/usage/documents/{TEST_DOC_ID}?calls=true", timeout=10)
+        if response.status_code == 200:
+            result = response.json()
+            print_stats('合计', result['totals'])
+            for stage, stats in result['stages'].items():
+                print_stats(stage, stats)
+            if result['calls']:
+                print(f"   最近一次调用: {json.dumps(result['calls'][-1], ensure_ascii=False)}")
+        else:
+            print(f"   ✗ 查询失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n2. 按小时查询最近24小时用量...")
+    try:
+        response = session.get(f"{BASE_URL}/api/usage", params={'bucket': 'hour'}, timeout=10)
+        if response.status_code == 200:
+            result = response.json()
+            print_stats('合计', result['totals'])
+            for window in result['windows']:
+                print_stats(window['start'], window)
+        else:
+            print(f"   ✗ 查询失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n" + "=" * 60)
+
+if __name__ == '__main__':
+    try:
+        test_usage_api()
+    except KeyboardInterrupt:
+        print("\n测试已取消")
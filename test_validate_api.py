@@ -39,6 +39,7 @@ def test_validate_api():
 
     print(f"\n2. 调用验证接口，doc_id: {TEST_DOC_ID}...")
     print("   正在调用大模型API进行验证，请稍候...")
+    unverified_count = 0
     try:
         response = session.post(
             f"{BASE_URL}/api/validate",
@@ -65,7 +66,10 @@ def test_validate_api():
             print("=" * 60)
 
             for i, result in enumerate(results):
-                status = "✓ 合规" if result.get('result') else "✗ 不合规"
+                if result.get('result') is None:
+                    status = "? 未验证"
+                else:
+                    status = "✓ 合规" if result.get('result') else "✗ 不合规"
                 print(f"\n[{i+1}] {result.get('name')}")
                 print(f"    ID: {result.get('id')}")
                 print(f"    状态: {status}")
@@ -76,12 +80,14 @@ def test_validate_api():
 
             pass_count = sum(1 for r in results if r.get('result') == True)
             fail_count = sum(1 for r in results if r.get('result') == False)
+            unverified_count = sum(1 for r in results if r.get('verified') is False)
 
             print(f"\n" + "=" * 60)
             print("统计汇总:")
             print("=" * 60)
             print(f"  ✓ 合规: {pass_count} 个")
             print(f"  ✗ 不合规: {fail_count} 个")
+            print(f"  ? 未验证: {unverified_count} 个")
             print(f"  总计: {len(results)} 个")
 
         else:
@@ -91,6 +97,21 @@ def test_validate_api():
     except Exception as e:
         print(f"✗ 错误: {e}")
         print(f"请确保Flask应用正在运行 (python run.py)")
+        return
+
+    if unverified_count:
+        print(f"\n3. 继续验证 {unverified_count} 个未验证节点...")
+        try:
+            response = session.post(f"{BASE_URL}/api/validate/{TEST_DOC_ID}/resume", timeout=600)
+            if response.status_code == 200:
+                data = response.json()
+                print(f"   ✓ 重新验证成功 {data.get('resumed')} 个节点")
+                print(f"   ✓ 剩余未验证: {data['stats']['unverified']} 个")
+            else:
+                print(f"   ✗ 继续验证失败: {response.status_code}")
+                print(f"   响应: {response.text}")
+        except Exception as e:
+            print(f"   ✗ 错误: {e}")
 
     print("\n" + "=" * 60)
 
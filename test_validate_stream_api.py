@@ -0,0 +1,60 @@
+import requests
+import json
+import time
+
+BASE_URL = "http://127.0.0.1:5000"
+TEST_DOC_ID = "bcab12d8-8874-4f8a-aaff-d3ba8e6d214d"
+
+session = requests.Session()
+session.trust_env = False
+
+def test_validate_stream_api():
+    print("=" * 60)
+    print("测试 /api/validate/<doc_id>/stream 接口 (流式验证)")
+    print("=" * 60)
+
+    print(f"\n1. 调用流式验证接口，doc_id: {TEST_DOC_ID}...")
+    start = time.time()
+    first_result_time = None
+    try:
+        response = session.get(
+            f"{BASE_URL}/api/validate/{TEST_DOC_ID}/stream",
+            stream=True,
+            timeout=600
+        )
+        if response.status_code != 200:
+            print(f"   ✗ 验证失败: {response.status_code}")
+            print(f"   响应: {response.text}")
+            return
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            event = json.loads(line.decode('utf-8'))
+            if event['type'] == 'results':
+                if first_result_time is None and event['done_batches'] > 0:
+                    first_result_time = time.time() - start
+                    print(f"   ✓ 首批大模型结论到达耗时: {first_result_time:.2f}秒")
+                print(f"   第 {event['done_batches']}/{event['total_batches']} 批, "
+                      f"已得出结论 {event['done_nodes']}/{event['total_nodes']} 个节点")
+                for result in event['results']:
+                    status = '合规' if result['result'] else '不合规'
+                    print(f"     {result['id']} [{result.get('source', 'llm')}] {status}: {result['reason'][:40]}")
+            elif event['type'] == 'error':
+                print(f"   ✗ 验证失败: {event['error']}")
+                return
+            elif event['type'] == 'done':
+                print(f"   ✓ 验证完成, 总耗时: {time.time() - start:.2f}秒")
+                print(f"   ✓ 是否缓存: {event.get('cached')}")
+                print(f"   ✓ 结论来源: {event.get('stats')}")
+                print(f"   ✓ 结果数: {len(event['validation_results'])}")
+    except Exception as e:
+        print(f"   ✗ 错误: {e}")
+
+    print("\n" + "=" * 60)
+
+if __name__ == '__main__':
+    try:
+        test_validate_stream_api()
+    except KeyboardInterrupt:
+        print("\n测试已取消")
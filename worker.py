@@ -0,0 +1,29 @@
+import argparse
+import multiprocessing
+import os
+import socket
+
+from app import app
+from app.models import db
+from app.jobs import work
+
+def start_worker(index):
+    # 子进程不能复用父进程创建的数据库连接
+    with app.app_context():
+        db.engine.dispose(close=False)
+    work(f"{socket.gethostname()}:{os.getpid()}:{index}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='解析/验证任务工作进程')
+    parser.add_argument('--processes', type=int, default=app.config.get('JOB_WORKER_PROCESSES', 2),
+                        help='启动的工作进程数')
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        start_worker(0)
+    else:
+        processes = [multiprocessing.Process(target=start_worker, args=(i,)) for i in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()